@@ -0,0 +1,147 @@
+"""
+Upload limit benchmark
+~~~~~~~~~~~~~~~~~~~~~~
+Times requests through a bare FastAPI application, the application behind
+the previous ``BaseHTTPMiddleware`` limiter and behind the ASGI
+``LimitUploadSize``. Requests are driven through the ASGI interface
+directly so the numbers are the per-request overhead of the middleware.
+
+    uv run python -m Benchmarks.upload_limit --requests 20000
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from fastapi import FastAPI, Request
+from starlette import status
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message
+
+from Services.Limiter.size_limiter import LimitUploadSize
+
+
+class DispatchLimitUploadSize(BaseHTTPMiddleware):
+    # the previous implementation, only checks the Content-Length of POSTs
+    def __init__(self, app: ASGIApp, max_upload_size: int) -> None:
+        super().__init__(app)
+        self.max_upload_size = max_upload_size
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        if request.method == "POST":
+            if "content-length" not in request.headers:
+                return Response(status_code=status.HTTP_411_LENGTH_REQUIRED)
+            content_length = int(request.headers["content-length"])
+            if content_length > self.max_upload_size:
+                return Response(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return await call_next(request)
+
+
+def create_app(middleware: type | None) -> ASGIApp:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping() -> dict:
+        return {}
+
+    @app.post("/echo")
+    async def echo(request: Request) -> dict:
+        return {"size": (await request.body()).__len__()}
+
+    if middleware is not None:
+        app.add_middleware(middleware, max_upload_size=1024 * 1024)
+    return app
+
+
+def scope(method: str, path: str, headers: list[tuple[bytes, bytes]]) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def request(app: ASGIApp, method: str, path: str, chunks: list[bytes]) -> int:
+    headers = [(b"host", b"localhost")]
+    if chunks.__len__() == 1:
+        headers.append((b"content-length", str(chunks[0].__len__()).encode()))
+    elif chunks:
+        headers.append((b"transfer-encoding", b"chunked"))
+    messages = [
+        {
+            "type": "http.request",
+            "body": chunk,
+            "more_body": index < chunks.__len__() - 1,
+        }
+        for index, chunk in enumerate(chunks or [b""])
+    ]
+    result = 0
+
+    async def receive() -> Message:
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        nonlocal result
+        if message["type"] == "http.response.start":
+            result = message["status"]
+
+    await app(scope(method, path, headers), receive, send)
+    return result
+
+
+async def main(requests: int, size: int) -> None:
+    cases = {
+        "GET": ("GET", "/ping", []),
+        "POST": ("POST", "/echo", [bytes(size)]),
+        "POST chunked": ("POST", "/echo", [bytes(size // 4)] * 4),
+    }
+    apps = {
+        "none": create_app(None),
+        "dispatch": create_app(DispatchLimitUploadSize),
+        "asgi": create_app(LimitUploadSize),
+    }
+
+    result = {}
+    for case, (method, path, chunks) in cases.items():
+        for name, app in apps.items():
+            for _ in range(100):
+                await request(app, method, path, chunks)
+            start = perf_counter()
+            for _ in range(requests):
+                code = await request(app, method, path, chunks)
+            result[case, name] = (perf_counter() - start) / requests * 1e6, code
+
+    print(
+        f"{'request':>14}{'none (us)':>12}{'dispatch (us)':>16}{'asgi (us)':>12}"
+        f"{'saved (us)':>12}"
+    )
+    for case in cases:
+        (bare, _), (before, code), (after, _) = [result[case, name] for name in apps]
+        # the previous limiter answered chunked uploads with 411
+        print(
+            f"{case:>14}{bare:>12.1f}{before:>12.1f} ({code}){after:>12.1f}"
+            f"{before - after:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload limit benchmark")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=1024 * 64, help="body bytes")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.size))
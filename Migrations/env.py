@@ -0,0 +1,50 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from Models.database import Base
+from Services.Database.database import engine
+
+alembic_config = context.config
+target_metadata = Base.metadata
+
+# Connection handed over by Services.Database.migration when run by the app
+connection: Connection | None = alembic_config.attributes.get("connection")
+
+if connection is None and alembic_config.config_file_name is not None:
+    fileConfig(alembic_config.config_file_name, disable_existing_loggers=False)
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection, target_metadata=target_metadata, render_as_batch=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif connection is not None:
+    do_run_migrations(connection)
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,92 @@
+"""Initial schema
+
+Tables as they were created by Base.metadata.create_all before migrations
+were introduced. Tables which already exist are left untouched, so
+databases created by older versions are adopted as they are.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 21:00:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0001"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    existing = (
+        set()
+        if context.is_offline_mode()
+        else set(sa.inspect(op.get_bind()).get_table_names())
+    )
+
+    if "user" not in existing:
+        op.create_table(
+            "user",
+            sa.Column("uid", sa.VARCHAR(32), primary_key=True),
+            sa.Column("username", sa.TEXT, nullable=False),
+            sa.Column("email", sa.TEXT, nullable=False),
+            sa.Column("password", sa.TEXT, nullable=False),
+            sa.Column("permission", sa.INT, nullable=False),
+            sa.Column("birthday", sa.DATE, nullable=True),
+            sa.Column("gender", sa.INT, nullable=False),
+            sa.Column("aid", sa.VARCHAR(32), nullable=True),
+        )
+    if "commodity" not in existing:
+        op.create_table(
+            "commodity",
+            sa.Column("cid", sa.VARCHAR(32), primary_key=True),
+            sa.Column("name", sa.TEXT, nullable=False),
+            sa.Column("price", sa.DECIMAL(10, 2), nullable=False),
+            sa.Column("description", sa.TEXT, nullable=True),
+            sa.Column("images", sa.JSON, nullable=False),
+        )
+    if "address" not in existing:
+        op.create_table(
+            "address",
+            sa.Column("aid", sa.VARCHAR(32), primary_key=True),
+            sa.Column("uid", sa.VARCHAR(32), nullable=False),
+            sa.Column("address", sa.TEXT, nullable=False),
+            sa.Column("phone", sa.TEXT, nullable=False),
+            sa.Column("name", sa.TEXT, nullable=False),
+        )
+    if "cart" not in existing:
+        op.create_table(
+            "cart",
+            sa.Column("rid", sa.VARCHAR(32), primary_key=True),
+            sa.Column("uid", sa.VARCHAR(32), nullable=False),
+            sa.Column("cid", sa.VARCHAR(32), nullable=False),
+            sa.Column("count", sa.INT, nullable=False),
+        )
+    if "comment" not in existing:
+        op.create_table(
+            "comment",
+            sa.Column("cid", sa.VARCHAR(32), primary_key=True),
+            sa.Column("uid", sa.VARCHAR(32), nullable=False),
+            sa.Column("commodity", sa.VARCHAR(32), nullable=False),
+            sa.Column("content", sa.TEXT, nullable=False),
+            sa.Column("time", sa.DATETIME(timezone=True), nullable=False),
+        )
+    if "order" not in existing:
+        op.create_table(
+            "order",
+            sa.Column("oid", sa.VARCHAR(32), primary_key=True),
+            sa.Column("uid", sa.VARCHAR(32), nullable=False),
+            sa.Column("aid", sa.VARCHAR(32), nullable=False),
+            sa.Column("content", sa.JSON, nullable=False),
+            sa.Column("time", sa.DATETIME(timezone=True), nullable=False),
+            sa.Column("status", sa.INT, nullable=False),
+        )
+
+
+def downgrade() -> None:
+    for table in ["order", "comment", "cart", "address", "commodity", "user"]:
+        op.drop_table(table)
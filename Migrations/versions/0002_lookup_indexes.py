@@ -0,0 +1,92 @@
+"""Index lookup columns
+
+Turn user.username and user.email into unique VARCHAR columns and add the
+secondary indexes used by login, cart, comment and order lookups. Users
+whose names or emails are too long or taken twice stop the upgrade before
+anything is altered, they have to be fixed by hand.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 21:10:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0002"
+down_revision: str | None = "0001"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+user = sa.table(
+    "user",
+    sa.column("uid", sa.VARCHAR(32)),
+    sa.column("username", sa.TEXT),
+    sa.column("email", sa.TEXT),
+)
+LIMITS = {"username": 64, "email": 254}
+
+
+def _check_users(bind: sa.Connection) -> None:
+    # VARCHAR lengths count characters, LENGTH() counts bytes on MySQL
+    length = sa.func.char_length if bind.dialect.name == "mysql" else sa.func.length
+    problems = []
+    for name, limit in LIMITS.items():
+        column = user.c[name]
+        uids = bind.scalars(sa.select(user.c.uid).where(length(column) > limit)).all()
+        if uids:
+            problems.append(f"{name} longer than {limit}: {', '.join(uids)}")
+        duplicated = (
+            sa.select(column).group_by(column).having(sa.func.count() > 1).subquery()
+        )
+        uids = bind.scalars(
+            sa.select(user.c.uid)
+            .where(column.in_(sa.select(duplicated.c[name])))
+            .order_by(column, user.c.uid)
+        ).all()
+        if uids:
+            problems.append(f"duplicate {name}: {', '.join(uids)}")
+    if problems:
+        raise RuntimeError(
+            "Cannot upgrade to 0002, fix these users first: " + "; ".join(problems)
+        )
+
+
+def upgrade() -> None:
+    if not context.is_offline_mode():
+        _check_users(op.get_bind())
+
+    with op.batch_alter_table("user") as batch:
+        batch.alter_column(
+            "username", existing_type=sa.TEXT, type_=sa.VARCHAR(64), nullable=False
+        )
+        batch.alter_column(
+            "email", existing_type=sa.TEXT, type_=sa.VARCHAR(254), nullable=False
+        )
+        batch.create_unique_constraint("uq_user_username", ["username"])
+        batch.create_unique_constraint("uq_user_email", ["email"])
+
+    op.create_index("ix_address_uid", "address", ["uid"])
+    op.create_index("ix_cart_uid_cid", "cart", ["uid", "cid"])
+    op.create_index("ix_comment_commodity", "comment", ["commodity"])
+    op.create_index("ix_order_uid_time", "order", ["uid", "time"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_uid_time", "order")
+    op.drop_index("ix_comment_commodity", "comment")
+    op.drop_index("ix_cart_uid_cid", "cart")
+    op.drop_index("ix_address_uid", "address")
+
+    with op.batch_alter_table("user") as batch:
+        batch.drop_constraint("uq_user_email", type_="unique")
+        batch.drop_constraint("uq_user_username", type_="unique")
+        batch.alter_column(
+            "email", existing_type=sa.VARCHAR(254), type_=sa.TEXT, nullable=False
+        )
+        batch.alter_column(
+            "username", existing_type=sa.VARCHAR(64), type_=sa.TEXT, nullable=False
+        )
@@ -0,0 +1,29 @@
+"""Index comments by commodity and time
+
+Comment listings are paginated by (time, cid) within a commodity, replace
+the single column commodity index with a composite one.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 22:00:00
+
+"""
+
+from typing import Sequence
+
+from alembic import op
+
+revision: str = "0003"
+down_revision: str | None = "0002"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_comment_commodity_time", "comment", ["commodity", "time"])
+    op.drop_index("ix_comment_commodity", "comment")
+
+
+def downgrade() -> None:
+    op.create_index("ix_comment_commodity", "comment", ["commodity"])
+    op.drop_index("ix_comment_commodity_time", "comment")
@@ -0,0 +1,60 @@
+"""Make cart items unique per user and commodity
+
+Duplicated (uid, cid) rows left by concurrent adds are merged into the
+oldest row before the unique key is created.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 22:30:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0004"
+down_revision: str | None = "0003"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+cart = sa.table(
+    "cart",
+    sa.column("rid", sa.VARCHAR(32)),
+    sa.column("uid", sa.VARCHAR(32)),
+    sa.column("cid", sa.VARCHAR(32)),
+    sa.column("count", sa.INT),
+)
+
+
+def upgrade() -> None:
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        duplicates = bind.execute(
+            sa.select(
+                cart.c.uid,
+                cart.c.cid,
+                sa.func.min(cart.c.rid),
+                sa.func.sum(cart.c.count),
+            )
+            .group_by(cart.c.uid, cart.c.cid)
+            .having(sa.func.count() > 1)
+        ).all()
+        for uid, cid, keep, total in duplicates:
+            bind.execute(cart.update().where(cart.c.rid == keep).values(count=total))
+            bind.execute(
+                cart.delete().where(
+                    cart.c.uid == uid, cart.c.cid == cid, cart.c.rid != keep
+                )
+            )
+
+    with op.batch_alter_table("cart") as batch:
+        batch.create_unique_constraint("uq_cart_uid_cid", ["uid", "cid"])
+        batch.drop_index("ix_cart_uid_cid")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("cart") as batch:
+        batch.create_index("ix_cart_uid_cid", ["uid", "cid"])
+        batch.drop_constraint("uq_cart_uid_cid", type_="unique")
@@ -0,0 +1,71 @@
+"""Snapshot unit prices into orders
+
+Existing orders are backfilled with the current catalog prices, commodities
+that no longer exist are left out of the snapshot.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 23:00:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0005"
+down_revision: str | None = "0004"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+order = sa.table(
+    "order",
+    sa.column("oid", sa.VARCHAR(32)),
+    sa.column("content", sa.JSON),
+    sa.column("price", sa.JSON),
+)
+commodity = sa.table(
+    "commodity", sa.column("cid", sa.VARCHAR(32)), sa.column("price", sa.DECIMAL)
+)
+
+
+def upgrade() -> None:
+    op.add_column("order", sa.Column("price", sa.JSON(), nullable=True))
+
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        last = ""
+        while rows := bind.execute(
+            sa.select(order.c.oid, order.c.content)
+            .where(order.c.oid > last)
+            .order_by(order.c.oid)
+            .limit(1000)
+        ).all():
+            cids = {cid for _, content in rows for cid in content}
+            price = dict(
+                bind.execute(
+                    sa.select(commodity.c.cid, commodity.c.price).where(
+                        commodity.c.cid.in_(cids)
+                    )
+                ).all()
+            )
+            for oid, content in rows:
+                bind.execute(
+                    order.update()
+                    .where(order.c.oid == oid)
+                    .values(
+                        price={
+                            cid: float(price[cid]) for cid in content if cid in price
+                        }
+                    )
+                )
+            last = rows[-1].oid
+
+    with op.batch_alter_table("order") as batch:
+        batch.alter_column("price", existing_type=sa.JSON(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("order") as batch:
+        batch.drop_column("price")
@@ -0,0 +1,97 @@
+"""Move order lines into an order_item table
+
+The JSON content and price columns of order are unpacked into one indexed
+row per commodity, so lookups by commodity no longer scan every order.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 23:30:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0006"
+down_revision: str | None = "0005"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+order = sa.table(
+    "order",
+    sa.column("oid", sa.VARCHAR(32)),
+    sa.column("content", sa.JSON),
+    sa.column("price", sa.JSON),
+)
+order_item = sa.table(
+    "order_item",
+    sa.column("oid", sa.VARCHAR(32)),
+    sa.column("cid", sa.VARCHAR(32)),
+    sa.column("count", sa.INT),
+    sa.column("unit_price", sa.DECIMAL(10, 2)),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_item",
+        sa.Column("oid", sa.VARCHAR(32), primary_key=True),
+        sa.Column("cid", sa.VARCHAR(32), primary_key=True),
+        sa.Column("count", sa.INT(), nullable=False),
+        sa.Column("unit_price", sa.DECIMAL(10, 2), nullable=True),
+    )
+    op.create_index("ix_order_item_cid", "order_item", ["cid"])
+
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        last = ""
+        while rows := bind.execute(
+            sa.select(order.c.oid, order.c.content, order.c.price)
+            .where(order.c.oid > last)
+            .order_by(order.c.oid)
+            .limit(1000)
+        ).all():
+            if items := [
+                {"oid": oid, "cid": cid, "count": count, "unit_price": price.get(cid)}
+                for oid, content, price in rows
+                for cid, count in content.items()
+            ]:
+                bind.execute(order_item.insert(), items)
+            last = rows[-1].oid
+
+    with op.batch_alter_table("order") as batch:
+        batch.drop_column("price")
+        batch.drop_column("content")
+
+
+def downgrade() -> None:
+    op.add_column("order", sa.Column("content", sa.JSON(), nullable=True))
+    op.add_column("order", sa.Column("price", sa.JSON(), nullable=True))
+
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        lines: dict[str, list] = {}
+        for oid, cid, count, unit_price in bind.execute(sa.select(order_item)):
+            lines.setdefault(oid, []).append((cid, count, unit_price))
+        for oid, items in lines.items():
+            bind.execute(
+                order.update()
+                .where(order.c.oid == oid)
+                .values(
+                    content={cid: count for cid, count, _ in items},
+                    price={
+                        cid: float(unit_price)
+                        for cid, _, unit_price in items
+                        if unit_price is not None
+                    },
+                )
+            )
+
+    with op.batch_alter_table("order") as batch:
+        batch.alter_column("content", existing_type=sa.JSON(), nullable=False)
+        batch.alter_column("price", existing_type=sa.JSON(), nullable=False)
+
+    op.drop_index("ix_order_item_cid", "order_item")
+    op.drop_table("order_item")
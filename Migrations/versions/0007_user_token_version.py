@@ -0,0 +1,40 @@
+"""Track a token version per user
+
+Access tokens carry the version they were issued for, bumping it revokes
+every outstanding token of the user. token_revoked_at keeps the set of
+recently revoked users small enough to hold in memory.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:10:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0007"
+down_revision: str | None = "0006"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("token_version", sa.INT(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "user",
+        sa.Column("token_revoked_at", sa.DATETIME(timezone=True), nullable=True),
+    )
+    op.create_index("ix_user_token_revoked_at", "user", ["token_revoked_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_token_revoked_at", "user")
+    with op.batch_alter_table("user") as batch:
+        batch.drop_column("token_revoked_at")
+        batch.drop_column("token_version")
@@ -0,0 +1,40 @@
+"""Store refresh token sessions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:50:00
+
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0008"
+down_revision: str | None = "0007"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "session",
+        sa.Column("sid", sa.VARCHAR(32), primary_key=True),
+        sa.Column("uid", sa.VARCHAR(32), nullable=False),
+        sa.Column("token_hash", sa.VARCHAR(64), nullable=False),
+        sa.Column("previous_hash", sa.VARCHAR(64), nullable=True),
+        sa.Column("user_agent", sa.VARCHAR(255), nullable=True),
+        sa.Column("created", sa.DATETIME(timezone=True), nullable=False),
+        sa.Column("last_used", sa.DATETIME(timezone=True), nullable=False),
+        sa.Column("expires", sa.DATETIME(timezone=True), nullable=False),
+        sa.UniqueConstraint("token_hash", name="uq_session_token_hash"),
+    )
+    op.create_index("ix_session_uid", "session", ["uid"])
+    op.create_index("ix_session_previous_hash", "session", ["previous_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_session_previous_hash", "session")
+    op.drop_index("ix_session_uid", "session")
+    op.drop_table("session")
@@ -0,0 +1,68 @@
+"""Record the type and size of stored files
+
+The MIME type used to be sniffed from the whole file on every download.
+Files already on disk are sniffed once here.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 01:30:00
+
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Sequence
+
+import filetype
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0009"
+down_revision: str | None = "0008"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+file = sa.table(
+    "file",
+    sa.column("fid", sa.VARCHAR(32)),
+    sa.column("mime", sa.VARCHAR(64)),
+    sa.column("size", sa.INT),
+    sa.column("created", sa.DATETIME(timezone=True)),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "file",
+        sa.Column("fid", sa.VARCHAR(32), primary_key=True),
+        sa.Column("mime", sa.VARCHAR(64), nullable=False),
+        sa.Column("size", sa.INT(), nullable=False),
+        sa.Column("created", sa.DATETIME(timezone=True), nullable=False),
+    )
+
+    data_path = Path(os.path.join(os.getcwd(), "Services/Storage/data"))
+    if not context.is_offline_mode() and data_path.exists():
+        rows = []
+        for path in data_path.iterdir():
+            if not path.is_file():
+                continue
+            # the signatures filetype knows all fit in the first 261 bytes
+            with open(path, "rb") as f:
+                mime = filetype.guess_mime(f.read(261))
+            if isinstance(mime, str):
+                stat = path.stat()
+                rows.append(
+                    {
+                        "fid": path.name,
+                        "mime": mime,
+                        "size": stat.st_size,
+                        "created": datetime.fromtimestamp(stat.st_mtime),
+                    }
+                )
+        if rows:
+            op.get_bind().execute(file.insert(), rows)
+
+
+def downgrade() -> None:
+    op.drop_table("file")
@@ -0,0 +1,77 @@
+"""Store uploads by content
+
+Identical uploads share one blob named by its SHA-256, every fid is an
+alias holding a reference to it. Files stored before keep their fid name
+and have no hash.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 02:40:00
+
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0010"
+down_revision: str | None = "0009"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+file = sa.table(
+    "file", sa.column("fid", sa.VARCHAR(32)), sa.column("hash", sa.VARCHAR(64))
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blob",
+        sa.Column("hash", sa.VARCHAR(64), primary_key=True),
+        sa.Column("size", sa.INT(), nullable=False),
+        sa.Column("refcount", sa.INT(), nullable=False),
+        sa.Column("created", sa.DATETIME(timezone=True), nullable=False),
+    )
+    op.add_column("file", sa.Column("hash", sa.VARCHAR(64), nullable=True))
+    op.create_index("ix_file_hash", "file", ["hash"])
+
+
+def _blob_file(data_path: Path, digest: str) -> Path | None:
+    # sharded by the current layout, flat until Services.Storage.layout moved it
+    for path in (
+        data_path.joinpath("blobs", digest[:2], digest[2:4], digest),
+        data_path.joinpath("blobs", digest),
+    ):
+        if path.is_file():
+            return path
+    return None
+
+
+def downgrade() -> None:
+    # files stored as blobs are only reachable through their hash, they are
+    # copied to their fid names first, which is what 0009 serves
+    if context.is_offline_mode():
+        raise RuntimeError("Downgrading 0010 copies stored files, run it online")
+    data_path = Path(os.path.join(os.getcwd(), "Services/Storage/data"))
+    rows = op.get_bind().execute(
+        sa.select(file.c.fid, file.c.hash).where(file.c.hash.is_not(None))
+    )
+    copies = []
+    for fid, digest in rows:
+        if (source := _blob_file(data_path, digest)) is None:
+            raise RuntimeError(
+                f"Blob {digest} of file {fid} is not in {data_path}, copy the "
+                "stored files there before downgrading"
+            )
+        copies.append((source, data_path.joinpath(fid)))
+    for source, target in copies:
+        shutil.copyfile(source, target)
+
+    op.drop_index("ix_file_hash", "file")
+    with op.batch_alter_table("file") as batch:
+        batch.drop_column("hash")
+    op.drop_table("blob")
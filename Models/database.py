@@ -1,22 +1,37 @@
 from datetime import date, datetime
 
-from sqlalchemy import DATE, DATETIME, DECIMAL, INT, JSON, TEXT, VARCHAR
+from sqlalchemy import (
+    DATE,
+    DATETIME,
+    DECIMAL,
+    INT,
+    JSON,
+    TEXT,
+    VARCHAR,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
-from Services.Config.config import config
-from Services.Database.database import Base, engine
+from Services.Database.database import Base
 
 
 class UserDb(Base):
     __tablename__ = "user"
     uid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
-    username: Mapped[str] = mapped_column(TEXT, nullable=False)
-    email: Mapped[str] = mapped_column(TEXT, nullable=False)
+    username: Mapped[str] = mapped_column(VARCHAR(64), nullable=False, unique=True)
+    email: Mapped[str] = mapped_column(VARCHAR(254), nullable=False, unique=True)
     password: Mapped[str] = mapped_column(TEXT, nullable=False)
     permission: Mapped[int] = mapped_column(INT, nullable=False)
     birthday: Mapped[date | None] = mapped_column(DATE, nullable=True)
     gender: Mapped[int] = mapped_column(INT, nullable=False)
     aid: Mapped[str | None] = mapped_column(VARCHAR(32), nullable=True)
+    token_version: Mapped[int] = mapped_column(
+        INT, nullable=False, default=0, server_default="0"
+    )
+    token_revoked_at: Mapped[datetime | None] = mapped_column(
+        DATETIME(timezone=True), nullable=True, index=True
+    )
 
 
 class CommodityDb(Base):
@@ -31,7 +46,7 @@ class CommodityDb(Base):
 class AddressDb(Base):
     __tablename__ = "address"
     aid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
-    uid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
+    uid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False, index=True)
     address: Mapped[str] = mapped_column(TEXT, nullable=False)
     phone: Mapped[str] = mapped_column(TEXT, nullable=False)
     name: Mapped[str] = mapped_column(TEXT, nullable=False)
@@ -39,6 +54,7 @@ class AddressDb(Base):
 
 class CartDb(Base):
     __tablename__ = "cart"
+    __table_args__ = (UniqueConstraint("uid", "cid", name="uq_cart_uid_cid"),)
     rid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
     uid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
     cid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
@@ -47,27 +63,72 @@ class CartDb(Base):
 
 class CommentDb(Base):
     __tablename__ = "comment"
+    __table_args__ = (Index("ix_comment_commodity_time", "commodity", "time"),)
     cid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
     uid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
     commodity: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
     content: Mapped[str] = mapped_column(TEXT, nullable=False)
     time: Mapped[datetime] = mapped_column(
-        DATETIME(timezone=True), default=datetime.now()
+        DATETIME(timezone=True), default=datetime.now
     )
 
 
 class OrderDb(Base):
     __tablename__ = "order"
+    __table_args__ = (Index("ix_order_uid_time", "uid", "time"),)
     oid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
     uid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
     aid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
-    content: Mapped[dict[str, int]] = mapped_column(JSON, nullable=False)
     time: Mapped[datetime] = mapped_column(
-        DATETIME(timezone=True), default=datetime.now()
+        DATETIME(timezone=True), default=datetime.now
     )
     status: Mapped[int] = mapped_column(INT, nullable=False)
 
 
-if config.test is not None and config.test.is_test:
-    Base.metadata.drop_all(engine)
-Base.metadata.create_all(engine, checkfirst=True)
+class OrderItemDb(Base):
+    __tablename__ = "order_item"
+    oid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
+    cid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True, index=True)
+    count: Mapped[int] = mapped_column(INT, nullable=False)
+    # orders placed before prices were snapshotted may lack a unit price
+    unit_price: Mapped[float | None] = mapped_column(DECIMAL(10, 2), nullable=True)
+
+
+class SessionDb(Base):
+    __tablename__ = "session"
+    sid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
+    uid: Mapped[str] = mapped_column(VARCHAR(32), nullable=False, index=True)
+    token_hash: Mapped[str] = mapped_column(VARCHAR(64), nullable=False, unique=True)
+    previous_hash: Mapped[str | None] = mapped_column(
+        VARCHAR(64), nullable=True, index=True
+    )
+    user_agent: Mapped[str | None] = mapped_column(VARCHAR(255), nullable=True)
+    created: Mapped[datetime] = mapped_column(
+        DATETIME(timezone=True), default=datetime.now
+    )
+    last_used: Mapped[datetime] = mapped_column(
+        DATETIME(timezone=True), default=datetime.now
+    )
+    expires: Mapped[datetime] = mapped_column(DATETIME(timezone=True), nullable=False)
+
+
+class BlobDb(Base):
+    __tablename__ = "blob"
+    hash: Mapped[str] = mapped_column(VARCHAR(64), primary_key=True)
+    size: Mapped[int] = mapped_column(INT, nullable=False)
+    refcount: Mapped[int] = mapped_column(INT, nullable=False)
+    created: Mapped[datetime] = mapped_column(
+        DATETIME(timezone=True), default=datetime.now
+    )
+
+
+class FileDb(Base):
+    __tablename__ = "file"
+    fid: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
+    # files uploaded before content addressing have no blob
+    hash: Mapped[str | None] = mapped_column(VARCHAR(64), nullable=True, index=True)
+    mime: Mapped[str] = mapped_column(VARCHAR(64), nullable=False)
+    size: Mapped[int] = mapped_column(INT, nullable=False)
+    created: Mapped[datetime] = mapped_column(
+        DATETIME(timezone=True), default=datetime.now
+    )
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class PoolStatus(BaseModel):
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    wait_avg_ms: float
+    wait_max_ms: float
+    available: bool = True
+
+
+class CacheStats(BaseModel):
+    size: int | None = None
+    maxsize: int | None = None
+    hits: int
+    misses: int
+    evictions: int = 0
+    hit_rate: float
+    bytes: int | None = None
+    maxbytes: int | None = None
+    evicted_bytes: int | None = None
+
+
+class StorageGcStatus(BaseModel):
+    running: bool = False
+    dry_run: bool = False
+    started: datetime | None = None
+    finished: datetime | None = None
+    scanned: int = 0
+    released: int = 0
+    removed: int = 0
+    freed: int = 0
@@ -19,5 +19,6 @@ class OrderBase(BaseModel):
 class Order(OrderBase):
     uid: str
     oid: str
+    price: dict[str, float]
     time: datetime
     status: OrderStatus
@@ -19,6 +19,24 @@ class BaseResponse[T](BaseModel):
     data: T | None = None
 
 
+class PagedResponse[T](BaseResponse[list[T]]):
+    """
+    Paged Response Class
+    ~~~~~~~~~~~~~~~~~~~~~~
+    This class is the response of paginated listings, `next` is the cursor
+    of the following page and `total` the size of the whole listing when
+    the endpoint reports it.
+    """
+
+    next: str | None = None
+    total: int | None = None
+
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
 class StandardResponse[T](JSONResponse):
     """
     Standard Response Class
@@ -42,6 +60,35 @@ class StandardResponse[T](JSONResponse):
         )
 
 
+class StandardPagedResponse[T](JSONResponse):
+    """
+    Standard Paged Response Class
+    ~~~~~~~~~~~~~~~~~~~~~~
+    This class is the web response of paginated listings.
+    """
+
+    def __init__(
+        self,
+        status_code: int = 200,
+        message: str | None = None,
+        data: list[T] | None = None,
+        next: str | None = None,
+        total: int | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        super().__init__(
+            content=PagedResponse[T](
+                status_code=status_code,
+                message=message,
+                data=data,
+                next=next,
+                total=total,
+            ).model_dump(mode="json"),
+            status_code=status_code,
+            headers=headers,
+        )
+
+
 class ExceptionResponseEnum(Enum):
     """
     Exception Response Enum
@@ -80,6 +127,11 @@ class ExceptionResponseEnum(Enum):
         detail="Resource conflict",
     )
 
+    TOO_LARGE = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Payload too large",
+    )
+
     def __call__(self) -> HTTPException:
         return self.value
 
@@ -21,11 +21,14 @@ class Gender(int, Enum):
     FEMALE = 0
 
 
-class User(BaseModel):
+class UserIdentity(BaseModel):
     uid: str
+    permission: Permission
+
+
+class User(UserIdentity):
     username: str
     email: str
-    permission: Permission
     birthday: date | None
     gender: Gender
     aid: str | None
@@ -52,9 +55,20 @@ class UpdateUser(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+
+class UserSession(BaseModel):
+    sid: str
+    user_agent: str | None
+    created: datetime
+    last_used: datetime
+    expires: datetime
 
 
 class TokenData(BaseModel):
     sub: str
     id: str
+    permission: int | None = None
+    version: int | None = None
     exp: datetime | None = None
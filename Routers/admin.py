@@ -0,0 +1,56 @@
+import logging
+
+from fastapi import APIRouter, Depends
+
+from Models.metrics import CacheStats, PoolStatus, StorageGcStatus
+from Models.response import BaseResponse, ExceptionResponseEnum, StandardResponse
+from Models.user import Permission, User
+from Services.Cache.catalog import catalog_cache
+from Services.Database.database import pool_status
+from Services.Security.user import get_current_user, user_cache, verify_user
+from Services.Storage.collector import collector
+from Services.Storage.manager import image_cache
+
+admin_router = APIRouter(prefix="/admin")
+logger = logging.getLogger("admin")
+
+
+@admin_router.get("/database", response_model=BaseResponse[dict[str, PoolStatus]])
+async def database_status(
+    user: User = Depends(get_current_user),
+) -> StandardResponse[dict[str, PoolStatus]]:
+    assert verify_user(user, Permission.ADMIN)
+    return StandardResponse[dict[str, PoolStatus]](data=pool_status())
+
+
+@admin_router.get("/cache", response_model=BaseResponse[dict[str, CacheStats]])
+async def cache_status(
+    user: User = Depends(get_current_user),
+) -> StandardResponse[dict[str, CacheStats]]:
+    assert verify_user(user, Permission.ADMIN)
+    return StandardResponse[dict[str, CacheStats]](
+        data=user_cache.stats() | catalog_cache.stats() | {"image": image_cache.stats()}
+    )
+
+
+@admin_router.get("/storage", response_model=BaseResponse[StorageGcStatus])
+async def storage_status(
+    user: User = Depends(get_current_user),
+) -> StandardResponse[StorageGcStatus]:
+    assert verify_user(user, Permission.ADMIN)
+    return StandardResponse[StorageGcStatus](data=collector.status)
+
+
+@admin_router.post(
+    "/storage/gc", response_model=BaseResponse[StorageGcStatus], status_code=202
+)
+async def storage_collect(
+    dry_run: bool = True,
+    user: User = Depends(get_current_user),
+) -> StandardResponse[StorageGcStatus]:
+    assert verify_user(user, Permission.ADMIN)
+    if not collector.start(dry_run):
+        raise ExceptionResponseEnum.RESOURCE_CONFILCT()
+    return StandardResponse[StorageGcStatus](
+        status_code=202, message="Collection started", data=collector.status
+    )
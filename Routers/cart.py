@@ -2,86 +2,92 @@ import logging
 from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, literal, select, update
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from Models.commodity import CartCommodity
 from Models.database import CartDb, CommodityDb
 from Models.response import BaseResponse, ExceptionResponseEnum, StandardResponse
-from Models.user import User
+from Models.user import UserIdentity
 from Services.Database.database import get_db
-from Services.Security.user import get_current_user
+from Services.Security.user import get_current_identity
 
 cart_router = APIRouter(prefix="/cart")
 logger = logging.getLogger("cart")
 
 
 @cart_router.post("/add/{cid}", response_model=BaseResponse)
-def add_cart(
+async def add_cart(
     cid: UUID,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
-    if db.query(CommodityDb).filter(CommodityDb.cid == cid).first() is None:
+    # INSERT ... SELECT only inserts when the commodity exists,
+    # ON DUPLICATE KEY on uq_cart_uid_cid turns a repeated add into count + 1
+    statement = insert(CartDb).from_select(
+        ["rid", "uid", "cid", "count"],
+        select(
+            literal(uuid4().hex), literal(user.uid), CommodityDb.cid, literal(1)
+        ).where(CommodityDb.cid == cid.hex),
+    )
+    result = await db.execute(statement.on_duplicate_key_update(count=CartDb.count + 1))
+    if result.rowcount == 0:
         raise ExceptionResponseEnum.NOT_FOUND()
-    if (
-        record := db.query(CartDb)
-        .filter(CartDb.cid == cid.hex, CartDb.uid == user.uid)
-        .first()
-    ) is not None:
-        record.count += 1
-    else:
-        db.add(CartDb(rid=uuid4().hex, cid=cid.hex, uid=user.uid, count=1))
-    db.commit()
+    await db.commit()
     return StandardResponse[None](message="Commodity added")
 
 
 @cart_router.delete("/remove/{cid}", response_model=BaseResponse)
-def remove_cart(
+async def remove_cart(
     cid: UUID,
     remove_all: bool = False,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
-    if (
-        record := db.query(CartDb)
-        .filter(CartDb.cid == cid.hex, CartDb.uid == user.uid)
-        .first()
-    ) is None:
-        raise ExceptionResponseEnum.NOT_FOUND()
-    if remove_all or record.count <= 1:
-        db.query(CartDb).filter(CartDb.cid == cid.hex, CartDb.uid == user.uid).delete()
+    condition = (CartDb.cid == cid.hex, CartDb.uid == user.uid)
+    if remove_all:
+        result = await db.execute(delete(CartDb).where(*condition))
     else:
-        record.count -= 1
-    db.commit()
+        result = await db.execute(
+            update(CartDb)
+            .where(*condition, CartDb.count > 1)
+            .values(count=CartDb.count - 1)
+        )
+        if result.rowcount == 0:
+            result = await db.execute(delete(CartDb).where(*condition))
+    if result.rowcount == 0:
+        raise ExceptionResponseEnum.NOT_FOUND()
+    await db.commit()
     return StandardResponse[None](message="Commodity deleted")
 
 
 @cart_router.delete("/all", response_model=BaseResponse)
-def clear_cart(
-    user: User = Depends(get_current_user), db: Session = Depends(get_db)
+async def clear_cart(
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
-    record = db.query(CartDb).filter(CartDb.uid == user.uid)
-    if len(record.all()) == 0:
+    result = await db.execute(delete(CartDb).where(CartDb.uid == user.uid))
+    if result.rowcount == 0:
         return StandardResponse[None](message="Cart is empty")
-    record.delete()
-    db.commit()
+    await db.commit()
     return StandardResponse[None](message="Cart cleared")
 
 
 @cart_router.get("/all", response_model=BaseResponse[list[CartCommodity]])
-def all_cart(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def all_cart(
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[list[CartCommodity]]:
-    data = db.query(CartDb).filter(CartDb.uid == user.uid).all()
+    data = (await db.scalars(select(CartDb).where(CartDb.uid == user.uid))).all()
     if not data:
         return StandardResponse[list[CartCommodity]](message=None, data=[])
 
     commodities_data = (
-        db.query(CommodityDb)
-        .filter(CommodityDb.cid.in_([item.cid for item in data]))
-        .all()
-    )
+        await db.scalars(
+            select(CommodityDb).where(CommodityDb.cid.in_([item.cid for item in data]))
+        )
+    ).all()
     commodities_dict = {commodity.cid: commodity for commodity in commodities_data}
 
     commodities = []
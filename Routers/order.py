@@ -1,16 +1,26 @@
 import logging
+from datetime import datetime
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from Models.database import CommodityDb, OrderDb
+from Models.database import AddressDb, CommodityDb, OrderDb, OrderItemDb
 from Models.order import Order, OrderBase, OrderStatus
-from Models.response import BaseResponse, ExceptionResponseEnum, StandardResponse
-from Models.user import Permission, User
-from Services.Database.database import get_db
+from Models.response import (
+    BaseResponse,
+    ExceptionResponseEnum,
+    PagedResponse,
+    SortOrder,
+    StandardPagedResponse,
+    StandardResponse,
+)
+from Models.user import Permission, UserIdentity
+from Services.Database import pagination
+from Services.Database.database import get_db, get_read_db
 from Services.Limiter.slow_limiter import freq_limiter
-from Services.Security.user import get_current_user, verify_user
+from Services.Security.user import get_current_identity, verify_user
 
 order_router = APIRouter(prefix="/order")
 logger = logging.getLogger("order")
@@ -18,96 +28,147 @@ logger = logging.getLogger("order")
 
 @order_router.post("/add", response_model=BaseResponse[str], status_code=201)
 @freq_limiter.limit("10/minute")
-def add_order(
+async def add_order(
     request: Request,
     body: OrderBase,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[str]:
     if body.content.__len__() < 1:
         raise ExceptionResponseEnum.INVALID_OPERATION()
 
-    for cid, count in body.content.items():
-        if count < 1:
-            raise ExceptionResponseEnum.INVALID_OPERATION()
-        if db.query(CommodityDb).filter(CommodityDb.cid == cid).first() is None:
-            raise ExceptionResponseEnum.NOT_FOUND()
+    if any(count < 1 for count in body.content.values()):
+        raise ExceptionResponseEnum.INVALID_OPERATION()
 
-    oid = uuid4().hex
-    db.add(
-        OrderDb(
-            oid=oid,
-            uid=user.uid,
-            aid=body.aid,
-            content=body.content,
-            status=OrderStatus.Idle.value,
+    # shared locks keep the address and commodities from being removed before
+    # the order is committed
+    if (
+        await db.scalar(
+            select(AddressDb.aid)
+            .where(AddressDb.aid == body.aid, AddressDb.uid == user.uid)
+            .with_for_update(read=True)
         )
+        is None
+    ):
+        raise ExceptionResponseEnum.NOT_FOUND()
+
+    price = {
+        cid: float(value)
+        for cid, value in await db.execute(
+            select(CommodityDb.cid, CommodityDb.price)
+            .where(CommodityDb.cid.in_(body.content.keys()))
+            .with_for_update(read=True)
+        )
+    }
+    if price.__len__() != body.content.__len__():
+        raise ExceptionResponseEnum.NOT_FOUND()
+
+    oid = uuid4().hex
+    db.add(OrderDb(oid=oid, uid=user.uid, aid=body.aid, status=OrderStatus.Idle.value))
+    db.add_all(
+        OrderItemDb(oid=oid, cid=cid, count=count, unit_price=price[cid])
+        for cid, count in body.content.items()
     )
-    db.commit()
+    await db.commit()
 
     return StandardResponse[str](status_code=201, message="Order created", data=oid)
 
 
-@order_router.get("/list", response_model=BaseResponse[list[Order]])
-def all_order(
-    page: int = 1, user: User = Depends(get_current_user), db: Session = Depends(get_db)
-) -> StandardResponse[list[Order]]:
-    if page < 1:
+@order_router.get("/list", response_model=PagedResponse[Order])
+async def all_order(
+    page: int | None = None,
+    cursor: str | None = None,
+    limit: int = 10,
+    order: SortOrder = SortOrder.DESC,
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_read_db),
+) -> StandardPagedResponse[Order]:
+    if limit < 1 or limit > 100:
         raise ExceptionResponseEnum.INVALID_OPERATION()
 
-    record = (
-        db.query(OrderDb)
-        .filter(OrderDb.uid == user.uid)
-        .offset((page - 1) * 10)
-        .limit(10)
-        .all()
+    keys = [OrderDb.time, OrderDb.oid]
+    query = (
+        select(OrderDb)
+        .where(OrderDb.uid == user.uid)
+        .order_by(*pagination.order_by(keys, order))
+        .limit(limit)
     )
-    return StandardResponse[list[Order]](
+    if page is not None:
+        if page < 1:
+            raise ExceptionResponseEnum.INVALID_OPERATION()
+        query = query.offset((page - 1) * limit)
+    elif cursor is not None:
+        query = query.where(
+            pagination.after(
+                keys,
+                pagination.decode_cursor(cursor, datetime.fromisoformat, str),
+                order,
+            )
+        )
+
+    record = (await db.scalars(query)).all()
+    items: dict[str, list[OrderItemDb]] = {item.oid: [] for item in record}
+    for line in await db.scalars(
+        select(OrderItemDb).where(OrderItemDb.oid.in_(items.keys()))
+    ):
+        items[line.oid].append(line)
+
+    return StandardPagedResponse[Order](
         data=[
             Order(
                 oid=item.oid,
                 uid=item.uid,
                 aid=item.aid,
-                content=item.content,
+                content={line.cid: line.count for line in items[item.oid]},
+                price={
+                    line.cid: float(line.unit_price)
+                    for line in items[item.oid]
+                    if line.unit_price is not None
+                },
                 time=item.time,
                 status=OrderStatus(item.status),
             )
             for item in record
-        ]
+        ],
+        next=(
+            pagination.encode_cursor(record[-1].time.isoformat(), record[-1].oid)
+            if record.__len__() == limit
+            else None
+        ),
     )
 
 
 @order_router.put("/{oid}/cancel", response_model=BaseResponse)
-def cancel_order(
+async def cancel_order(
     oid: str,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
-    if (record := db.query(OrderDb).filter(OrderDb.oid == oid).first()) is None:
+    if (record := await db.scalar(select(OrderDb).where(OrderDb.oid == oid))) is None:
         raise ExceptionResponseEnum.NOT_FOUND()
 
     if record.uid != user.uid or record.status != OrderStatus.Idle.value:
         raise ExceptionResponseEnum.INVALID_OPERATION()
 
     record.status = OrderStatus.Canceled.value
-    db.commit()
+    await db.commit()
 
     return StandardResponse[None](message="Order canceled")
 
 
 @order_router.put("/{oid}", response_model=BaseResponse)
-def update_order_status(
+async def update_order_status(
     oid: str,
     status: OrderStatus,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     assert verify_user(user, Permission.ADMIN)
 
-    if (record := db.query(OrderDb).filter(OrderDb.oid == oid).first()) is None:
+    if (record := await db.scalar(select(OrderDb).where(OrderDb.oid == oid))) is None:
         raise ExceptionResponseEnum.NOT_FOUND()
 
     record.status = status.value
-    db.commit()
+    await db.commit()
 
     return StandardResponse[None](message="Order status updated")
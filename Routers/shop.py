@@ -1,10 +1,12 @@
-import asyncio
+import json
 import logging
+from datetime import datetime
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, Form, Response, UploadFile
+from fastapi import APIRouter, Depends, Form, Request, Response, UploadFile
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from Models.commodity import (
     BaseCommodity,
@@ -14,12 +16,39 @@ from Models.commodity import (
     CreateCommodity,
     UpdateCommodity,
 )
-from Models.database import CommentDb, CommodityDb
-from Models.response import BaseResponse, ExceptionResponseEnum, StandardResponse
+from Models.database import CommentDb, CommodityDb, FileDb
+from Models.response import (
+    BaseResponse,
+    ExceptionResponseEnum,
+    PagedResponse,
+    SortOrder,
+    StandardPagedResponse,
+    StandardResponse,
+)
 from Models.user import Permission, User
-from Services.Database.database import get_db
+from Services.Cache.catalog import (
+    catalog_cache,
+    invalidate_commodity,
+    listing_generation,
+)
+from Services.Cache.conditional import (
+    IMMUTABLE,
+    REVALIDATE,
+    json_response,
+    not_modified,
+    validators,
+)
+from Services.Database import pagination
+from Services.Database.database import get_db, get_read_db
 from Services.Security.user import get_current_user, verify_user
-from Services.Storage.manager import load_file_async, remove_file, save_file_async
+from Services.Storage.manager import (
+    file_response,
+    get_file,
+    remove_file,
+    save_files_async,
+    storage_key,
+)
+from Services.Storage.variant import choose_variant, variant_response
 
 shop_router = APIRouter(prefix="/shop")
 logger = logging.getLogger("shop")
@@ -30,7 +59,7 @@ async def add_commodity(
     body: CreateCommodity = Form(),
     images: list[UploadFile] = [],
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[str]:
     assert verify_user(user, Permission.ADMIN)
     if images.__len__() > 5:
@@ -38,8 +67,7 @@ async def add_commodity(
 
     cid = uuid4()
 
-    tasks = [save_file_async(await img.read()) for img in images]
-    imgs_id = await asyncio.gather(*tasks)
+    imgs_id = await save_files_async(db, images)
 
     db.add(
         CommodityDb(
@@ -48,41 +76,110 @@ async def add_commodity(
             **body.model_dump(),
         )
     )
-    db.commit()
+    await db.commit()
+    await invalidate_commodity(cid.hex, membership=True)
 
     return StandardResponse[str](
         status_code=201, message="Commodity added", data=cid.hex
     )
 
 
-@shop_router.get("/all", response_model=BaseResponse[list[BaseCommodity]])
-def all_commodity(
-    page: int = 1, db: Session = Depends(get_db)
-) -> StandardResponse[list[BaseCommodity]]:
-    if page < 1:
+def _summary(record: CommodityDb) -> dict:
+    return BaseCommodity(
+        cid=record.cid,
+        name=record.name,
+        price=record.price,
+        album=record.images[0] if record.images.__len__() > 0 else None,
+    ).model_dump(mode="json")
+
+
+@shop_router.get("/all", response_model=PagedResponse[BaseCommodity])
+async def all_commodity(
+    request: Request,
+    page: int | None = None,
+    cursor: str | None = None,
+    limit: int = 50,
+    order: SortOrder = SortOrder.ASC,
+    # shared cache entries are filled from the primary, a lagging replica
+    # would publish a stale price
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    if limit < 1 or limit > 100 or (page is not None and page < 1):
         raise ExceptionResponseEnum.INVALID_OPERATION()
 
-    commodities = [
-        BaseCommodity(
-            cid=item.cid,
-            name=item.name,
-            price=item.price,
-            album=item.images[0] if item.images.__len__() > 0 else None,
+    query = (
+        select(CommodityDb)
+        .order_by(*pagination.order_by([CommodityDb.cid], order))
+        .limit(limit)
+    )
+    if page is not None:
+        query = query.offset((page - 1) * limit)
+    elif cursor is not None:
+        query = query.where(
+            pagination.after(
+                [CommodityDb.cid], pagination.decode_cursor(cursor, str), order
+            )
         )
-        for item in db.query(CommodityDb).offset((page - 1) * 50).limit(50).all()
-    ]
 
-    return StandardResponse[list[BaseCommodity]](message=None, data=commodities)
+    async def fill() -> dict:
+        records = (await db.scalars(query)).all()
+        return {
+            "cids": [item.cid for item in records],
+            "next": (
+                pagination.encode_cursor(records[-1].cid)
+                if records.__len__() == limit
+                else None
+            ),
+        }
+
+    # the page only stores its membership, entries come from the summaries so
+    # an edit never leaves a stale copy in a listing
+    position = f"page={page}" if page is not None else f"cursor={cursor or ''}"
+    listing = await catalog_cache.get_or_set(
+        f"list:{await listing_generation()}:{order.value}:{limit}:{position}", fill
+    )
+    summaries = {
+        cid: await catalog_cache.get(f"summary:{cid}") for cid in listing["cids"]
+    }
+    if missing := [cid for cid, summary in summaries.items() if summary is None]:
+        # versions are read first, a summary edited meanwhile is not published
+        versions = {
+            cid: await catalog_cache.version(f"summary:{cid}") for cid in missing
+        }
+        for item in await db.scalars(
+            select(CommodityDb).where(CommodityDb.cid.in_(missing))
+        ):
+            summaries[item.cid] = _summary(item)
+            await catalog_cache.set(
+                f"summary:{item.cid}", summaries[item.cid], versions[item.cid]
+            )
+
+    return json_response(
+        request,
+        json.dumps(
+            {
+                "status_code": 200,
+                "message": None,
+                "data": [item for item in summaries.values() if item is not None],
+                "next": listing["next"],
+                "total": None,
+            }
+        ),
+    )
 
 
 @shop_router.get("/item/{commodity}", response_model=BaseResponse[Commodity])
-def get_commodity(
-    commodity: UUID, db: Session = Depends(get_db)
-) -> StandardResponse[Commodity]:
-    if (
-        record := db.query(CommodityDb).filter(CommodityDb.cid == commodity.hex).first()
-    ) is not None:
-        return StandardResponse[Commodity](
+async def get_commodity(
+    request: Request, commodity: UUID, db: AsyncSession = Depends(get_db)
+) -> Response:
+    async def fill() -> str | None:
+        if (
+            record := await db.scalar(
+                select(CommodityDb).where(CommodityDb.cid == commodity.hex)
+            )
+        ) is None:
+            return None
+        return BaseResponse[Commodity](
             status_code=200,
             message=None,
             data=Commodity(
@@ -93,35 +190,81 @@ def get_commodity(
                 images=record.images,
                 album=record.images[0] if record.images.__len__() > 0 else None,
             ),
-        )
+        ).model_dump_json()
+
+    if (body := await catalog_cache.get_or_set(f"item:{commodity.hex}", fill)) is None:
+        raise ExceptionResponseEnum.NOT_FOUND()
+    # the body is cached already, hashing it is cheap next to sending it again
+    return json_response(request, body)
+
+
+async def _image_response(
+    request: Request, stored: FileDb, width: int | None, cache_control: str
+) -> Response:
+    # the content hash is a free strong tag, every variant has a tag of its own
+    key = storage_key(stored)
+    variant = choose_variant(stored.mime, request.headers.get("accept"), width)
+    tag = key if variant is None else f"{key}.{variant[0]}.{variant[1]}"
+    headers = validators(f'"{tag}"', stored.created, cache_control)
+    headers["Vary"] = "Accept"
+    if (response := not_modified(request, headers)) is not None:
+        return response
+
+    def byte_range() -> str | None:
+        # a stale If-Range asks for the whole file again
+        if request.headers.get("if-range", headers["ETag"]) != headers["ETag"]:
+            return None
+        return request.headers.get("range")
+
+    if variant is not None:
+        if (
+            response := await variant_response(stored, variant, headers, byte_range())
+        ) is not None:
+            return response
+        # an image the encoder rejects is still served as uploaded
+        headers["ETag"] = f'"{key}"'
+    if (response := await file_response(stored, headers, byte_range())) is not None:
+        return response
     raise ExceptionResponseEnum.NOT_FOUND()
 
 
 @shop_router.get("/item/{commodity}/album", response_class=Response)
 async def get_commodity_album(
-    commodity: UUID, db: Session = Depends(get_db)
+    request: Request,
+    commodity: UUID,
+    w: int | None = None,
+    db: AsyncSession = Depends(get_read_db),
 ) -> Response:
+    if w is not None and w < 1:
+        raise ExceptionResponseEnum.INVALID_OPERATION()
     if (
         (
-            record := db.query(CommodityDb)
-            .filter(CommodityDb.cid == commodity.hex)
-            .first()
+            record := await db.scalar(
+                select(CommodityDb).where(CommodityDb.cid == commodity.hex)
+            )
         )
-        is not None
-        and (album := record.images[0] if record.images.__len__() > 0 else None)
-        is not None
-        and (data := await load_file_async(UUID(album))) is not None
+        is None
+        or (album := record.images[0] if record.images.__len__() > 0 else None) is None
+        or (stored := await get_file(db, UUID(album))) is None
     ):
-        return Response(content=data[0], media_type=data[1])
-    raise ExceptionResponseEnum.NOT_FOUND()
+        raise ExceptionResponseEnum.NOT_FOUND()
 
+    # the album of a commodity changes on edit, clients have to revalidate
+    return await _image_response(request, stored, w, REVALIDATE)
 
-@shop_router.get("/image/{fid}", response_class=Response)
-async def get_commodity_image(fid: UUID) -> Response:
-    if (data := await load_file_async(fid)) is not None:
-        return Response(content=data[0], media_type=data[1])
 
-    raise ExceptionResponseEnum.NOT_FOUND()
+@shop_router.get("/image/{fid}", response_class=Response)
+async def get_commodity_image(
+    request: Request,
+    fid: UUID,
+    w: int | None = None,
+    db: AsyncSession = Depends(get_read_db),
+) -> Response:
+    if w is not None and w < 1:
+        raise ExceptionResponseEnum.INVALID_OPERATION()
+    if (stored := await get_file(db, fid)) is None:
+        raise ExceptionResponseEnum.NOT_FOUND()
+    return await _image_response(request, stored, w, IMMUTABLE)
 
 
 @shop_router.put("/item/{cid}", response_model=BaseResponse)
@@ -131,12 +274,12 @@ async def edit_commodity(
     body: UpdateCommodity = Form(),
     images: list[UploadFile] = [],
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     assert verify_user(user, Permission.ADMIN)
 
     if (
-        record := db.query(CommodityDb).filter(CommodityDb.cid == cid.hex).first()
+        record := await db.scalar(select(CommodityDb).where(CommodityDb.cid == cid.hex))
     ) is not None:
         if body.name is not None:
             record.name = body.name
@@ -148,37 +291,40 @@ async def edit_commodity(
             raise ExceptionResponseEnum.INVALID_OPERATION()
 
         if no_images or images.__len__() > 0:
+            # saved first, a rejected upload leaves the old images in place
+            imgs_id = await save_files_async(db, images)
             for img in record.images:
-                if not remove_file(UUID(img)):
+                if not await remove_file(db, UUID(img)):
                     logger.warning(f"Failed to remove image {img}, record {cid}")
-            tasks = [save_file_async(await img.read()) for img in images]
-            imgs_id = await asyncio.gather(*tasks)
 
             record.images = jsonable_encoder([img.hex for img in imgs_id])
-        db.commit()
+        await db.commit()
+        await invalidate_commodity(cid.hex)
         return StandardResponse[None](message="Commodity updated")
     raise ExceptionResponseEnum.NOT_FOUND()
 
 
 @shop_router.delete("/item/{cid}", response_model=BaseResponse)
-def remove_commodity(
-    cid: UUID, user: User = Depends(get_current_user), db: Session = Depends(get_db)
+async def remove_commodity(
+    cid: UUID,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     assert verify_user(user, Permission.ADMIN)
 
     if (
-        record := db.query(CommodityDb).filter(CommodityDb.cid == cid.hex).first()
+        record := await db.scalar(select(CommodityDb).where(CommodityDb.cid == cid.hex))
     ) is not None:
         imgs = record.images
-        db.delete(record)
-
-        for comment in db.query(CommentDb).filter(CommentDb.commodity == cid.hex).all():
-            db.delete(comment)
+        await db.delete(record)
+        await db.execute(delete(CommentDb).where(CommentDb.commodity == cid.hex))
 
-        db.commit()
         for img in imgs:
-            if not remove_file(UUID(img)):
+            if not await remove_file(db, UUID(img)):
                 logger.warning(f"Failed to remove image {img}, record {cid}")
+
+        await db.commit()
+        await invalidate_commodity(cid.hex, membership=True)
         return StandardResponse[None](message="Commodity removed")
 
     else:
@@ -186,13 +332,16 @@ def remove_commodity(
 
 
 @shop_router.post("/item/{cid}/comment", response_model=BaseResponse, status_code=201)
-def add_comment(
+async def add_comment(
     cid: UUID,
     body: CommentBase,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
-    if db.query(CommodityDb).filter(CommodityDb.cid == cid.hex).first() is not None:
+    if (
+        await db.scalar(select(CommodityDb).where(CommodityDb.cid == cid.hex))
+        is not None
+    ):
         db.add(
             CommentDb(
                 cid=uuid4().hex,
@@ -201,44 +350,84 @@ def add_comment(
                 content=body.content,
             )
         )
-        db.commit()
+        await db.commit()
         return StandardResponse[None](status_code=201, message="Comment added")
     raise ExceptionResponseEnum.NOT_FOUND()
 
 
-@shop_router.get("/item/{cid}/comment", response_model=BaseResponse[list[Comment]])
-def get_comment(
+@shop_router.get("/item/{cid}/comment", response_model=PagedResponse[Comment])
+async def get_comment(
     cid: UUID,
-    db: Session = Depends(get_db),
-) -> StandardResponse[list[Comment]]:
-    if db.query(CommodityDb).filter(CommodityDb.cid == cid.hex).first() is not None:
-        comments = [
-            Comment(
-                cid=item.cid,
-                uid=item.uid,
-                commodity=item.commodity,
-                content=item.content,
-                time=item.time,
+    cursor: str | None = None,
+    limit: int = 20,
+    order: SortOrder = SortOrder.DESC,
+    db: AsyncSession = Depends(get_read_db),
+) -> StandardPagedResponse[Comment]:
+    if limit < 1 or limit > 100:
+        raise ExceptionResponseEnum.INVALID_OPERATION()
+    if await db.scalar(select(CommodityDb).where(CommodityDb.cid == cid.hex)) is None:
+        raise ExceptionResponseEnum.NOT_FOUND()
+
+    keys = [CommentDb.time, CommentDb.cid]
+    query = (
+        select(CommentDb)
+        .where(CommentDb.commodity == cid.hex)
+        .order_by(*pagination.order_by(keys, order))
+        .limit(limit)
+    )
+    total = None
+    if cursor is not None:
+        query = query.where(
+            pagination.after(
+                keys,
+                pagination.decode_cursor(cursor, datetime.fromisoformat, str),
+                order,
             )
-            for item in db.query(CommentDb).filter(CommentDb.commodity == cid.hex).all()
-        ]
+        )
+    else:
+        # Counted once on the first page, served from ix_comment_commodity_time
+        total = await db.scalar(
+            select(func.count())
+            .select_from(CommentDb)
+            .where(CommentDb.commodity == cid.hex)
+        )
 
-        return StandardResponse[list[Comment]](message=None, data=comments)
-    raise ExceptionResponseEnum.NOT_FOUND()
+    records = (await db.scalars(query)).all()
+    comments = [
+        Comment(
+            cid=item.cid,
+            uid=item.uid,
+            commodity=item.commodity,
+            content=item.content,
+            time=item.time,
+        )
+        for item in records
+    ]
+
+    return StandardPagedResponse[Comment](
+        message=None,
+        data=comments,
+        next=(
+            pagination.encode_cursor(records[-1].time.isoformat(), records[-1].cid)
+            if records.__len__() == limit
+            else None
+        ),
+        total=total,
+    )
 
 
 @shop_router.delete("/comment/{id}", response_model=BaseResponse)
-def remove_comment(
+async def remove_comment(
     id: UUID,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     if (
-        record := db.query(CommentDb).filter(CommentDb.cid == id.hex).first()
+        record := await db.scalar(select(CommentDb).where(CommentDb.cid == id.hex))
     ) is not None:
         if record.uid != user.uid and not verify_user(user, Permission.ADMIN):
             raise ExceptionResponseEnum.PERMISSION_DENIED()
-        db.delete(record)
-        db.commit()
+        await db.delete(record)
+        await db.commit()
         return StandardResponse[None](message="Comment removed")
     raise ExceptionResponseEnum.NOT_FOUND()
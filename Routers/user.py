@@ -1,33 +1,36 @@
 import logging
-from datetime import timedelta
 from uuid import UUID, uuid4
 
-import bcrypt
 from email_validator import EmailNotValidError, validate_email
 from fastapi import APIRouter, Depends, Form, Header, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from Models.database import AddressDb, UserDb
+from Models.database import AddressDb, SessionDb, UserDb
 from Models.response import BaseResponse, ExceptionResponseEnum, StandardResponse
 from Models.user import (
     AddressBase,
     Gender,
     Permission,
     Token,
-    TokenData,
     UpdateUser,
     User,
     UserAddress,
+    UserSession,
 )
 from Services.Cache.cache import cache
 from Services.Database.database import get_db
 from Services.Limiter.slow_limiter import freq_limiter
 from Services.Mail.mail import Purpose, send_captcha
+from Services.Security.password import hash_password, needs_rehash, verify_password
+from Services.Security.session import create_session, revoke_sessions, rotate_session
 from Services.Security.user import (
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    create_access_token,
+    create_user_token,
     get_current_user,
+    invalidate_user,
+    revoke_tokens,
     verify_user,
 )
 
@@ -81,27 +84,29 @@ async def register_user(
     gender: str = Form(),
     captcha: str = Form(),
     request_id: str = Header(convert_underscores=True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     try:
         emailinfo = validate_email(email, check_deliverability=False)
         normalized_email = emailinfo.normalized
     except EmailNotValidError:
         raise ExceptionResponseEnum.INVALID_OPERATION()
-    is_init_user = db.query(UserDb).first() is None
+    is_init_user = await db.scalar(select(UserDb).limit(1)) is None
 
     try:
         gender_data = Gender(int(gender))
     except ValueError:
         raise ExceptionResponseEnum.INVALID_OPERATION()
 
-    if password.strip().__len__() < 6:
+    if password.strip().__len__() < 6 or username.__len__() > 64:
         raise ExceptionResponseEnum.INVALID_OPERATION()
 
     if (
-        db.query(UserDb)
-        .filter((UserDb.email == normalized_email) | (UserDb.username == username))
-        .first()
+        await db.scalar(
+            select(UserDb).where(
+                (UserDb.email == normalized_email) | (UserDb.username == username)
+            )
+        )
         is not None
     ):
         raise ExceptionResponseEnum.RESOURCE_CONFILCT()
@@ -118,39 +123,128 @@ async def register_user(
             uid=request_id,
             email=normalized_email,
             username=username,
-            password=bcrypt.hashpw(bytes(password, "utf-8"), bcrypt.gensalt()),
+            password=await hash_password(password),
             permission=Permission.ADMIN() if is_init_user else Permission.USER(),
             birthday=None,
             gender=gender_data.value,
             aid=None,
         )
     )
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # a concurrent registration took the email or username after the check
+        await db.rollback()
+        raise ExceptionResponseEnum.RESOURCE_CONFILCT()
     return StandardResponse[None](status_code=201, message="User created")
 
 
 @user_router.post("/login", response_model=BaseResponse[Token])
 @freq_limiter.limit("10/minute")
-def login_user(
+async def login_user(
     request: Request,
     body: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[Token]:
-    user: UserDb | None = (
-        db.query(UserDb).filter(UserDb.username == body.username).first()
+    user: UserDb | None = await db.scalar(
+        select(UserDb).where(UserDb.username == body.username)
     )
 
-    if user is None or not bcrypt.checkpw(
-        bytes(body.password, "utf-8"), bytes(user.password, "utf-8")
-    ):
+    if user is None or not await verify_password(body.password, user.password):
+        raise ExceptionResponseEnum.AUTH_FAILED()
+
+    if needs_rehash(user.password):
+        user.password = await hash_password(body.password)
+
+    refresh_token = await create_session(
+        db, user.uid, request.headers.get("user-agent")
+    )
+    token = create_user_token(user)
+    await db.commit()
+
+    return StandardResponse[Token](
+        data=Token(access_token=token, token_type="bearer", refresh_token=refresh_token)
+    )
+
+
+@user_router.post("/refresh", response_model=BaseResponse[Token])
+@freq_limiter.limit("30/minute")
+async def refresh_user(
+    request: Request,
+    refresh_token: str = Form(),
+    db: AsyncSession = Depends(get_db),
+) -> StandardResponse[Token]:
+    session, refresh_token = await rotate_session(db, refresh_token)
+    if (
+        user := await db.scalar(select(UserDb).where(UserDb.uid == session.uid))
+    ) is None:
         raise ExceptionResponseEnum.AUTH_FAILED()
 
-    token = create_access_token(
-        data=TokenData(sub=user.uid, id=user.uid),
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    token = create_user_token(user)
+    await db.commit()
+
+    return StandardResponse[Token](
+        data=Token(access_token=token, token_type="bearer", refresh_token=refresh_token)
+    )
+
+
+@user_router.get("/session", response_model=BaseResponse[list[UserSession]])
+async def all_session(
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> StandardResponse[list[UserSession]]:
+    record = (
+        await db.scalars(
+            select(SessionDb)
+            .where(SessionDb.uid == user.uid)
+            .order_by(SessionDb.last_used.desc())
+        )
+    ).all()
+
+    return StandardResponse[list[UserSession]](
+        data=[
+            UserSession(
+                sid=item.sid,
+                user_agent=item.user_agent,
+                created=item.created,
+                last_used=item.last_used,
+                expires=item.expires,
+            )
+            for item in record
+        ]
+    )
+
+
+@user_router.delete("/session/{sid}", response_model=BaseResponse)
+async def revoke_session(
+    sid: UUID,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> StandardResponse[None]:
+    result = await db.execute(
+        delete(SessionDb).where(SessionDb.sid == sid.hex, SessionDb.uid == user.uid)
     )
+    if result.rowcount == 0:
+        raise ExceptionResponseEnum.NOT_FOUND()
+    await db.commit()
+    return StandardResponse[None](message="Session revoked")
+
+
+@user_router.post("/logout", response_model=BaseResponse)
+async def logout_user(
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> StandardResponse[None]:
+    if (
+        record := await db.scalar(select(UserDb).where(UserDb.uid == user.uid))
+    ) is None:
+        raise ExceptionResponseEnum.NOT_FOUND()
 
-    return StandardResponse[Token](data=Token(access_token=token, token_type="bearer"))
+    revoke_tokens(record)
+    await revoke_sessions(db, record.uid)
+    await db.commit()
+    await invalidate_user(record.uid, record.token_version)
+    return StandardResponse[None](message="Logged out")
 
 
 @user_router.post("/recover", response_model=BaseResponse)
@@ -161,9 +255,9 @@ async def recover_user(
     password: str = Form(),
     captcha: str = Form(),
     request_id: str = Header(convert_underscores=True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[str]:
-    if (record := db.query(UserDb).filter(UserDb.email == email).first()) is None:
+    if (record := await db.scalar(select(UserDb).where(UserDb.email == email))) is None:
         raise ExceptionResponseEnum.NOT_FOUND()
 
     try:
@@ -182,56 +276,66 @@ async def recover_user(
 
     await cache.delete(f"{normalized_email}_{request_id}")
 
-    record.password = bcrypt.hashpw(bytes(password, "utf-8"), bcrypt.gensalt()).decode(
-        "utf-8"
-    )
+    record.password = await hash_password(password)
+    revoke_tokens(record)
+    await revoke_sessions(db, record.uid)
     username = record.username
-    db.commit()
+    await db.commit()
+    await invalidate_user(record.uid, record.token_version)
 
     return StandardResponse[str](message="Password recovered", data=username)
 
 
 @user_router.put("/profile/{uid}", response_model=BaseResponse)
-def edit_user(
+async def edit_user(
     uid: UUID,
     body: UpdateUser,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     if uid.hex != user.uid:
         assert verify_user(user, Permission.ADMIN)
 
-    if (record := db.query(UserDb).filter(UserDb.uid == uid.hex).first()) is not None:
+    if (
+        record := await db.scalar(select(UserDb).where(UserDb.uid == uid.hex))
+    ) is not None:
         if body.birthday is not None:
             record.birthday = body.birthday
         if body.gender is not None:
             record.gender = body.gender.value
+        revoked = False
         if body.permission is not None and record.permission != body.permission.value:
             assert verify_user(user, Permission.ADMIN)
             record.permission = body.permission()
+            revoked = True
         if body.password is not None:
-            record.password = bcrypt.hashpw(
-                bytes(body.password, "utf-8"), bcrypt.gensalt()
-            ).decode("utf-8")
-        db.commit()
+            record.password = await hash_password(body.password)
+            await revoke_sessions(db, record.uid)
+            revoked = True
+        if revoked:
+            revoke_tokens(record)
+        await db.commit()
+        await invalidate_user(uid.hex, record.token_version if revoked else None)
         return StandardResponse[None](message="User updated")
     else:
         raise ExceptionResponseEnum.NOT_FOUND()
 
 
 @user_router.get("/profile", response_model=BaseResponse[User])
-def self_profile_user(
+async def self_profile_user(
     user: User = Depends(get_current_user),
 ) -> StandardResponse[User]:
     return StandardResponse[User](data=user)
 
 
 @user_router.get("/profile/{uid}", response_model=BaseResponse[User])
-def profile_user(
+async def profile_user(
     uid: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[User]:
-    if (record := db.query(UserDb).filter(UserDb.uid == uid.hex).first()) is not None:
+    if (
+        record := await db.scalar(select(UserDb).where(UserDb.uid == uid.hex))
+    ) is not None:
         return StandardResponse[User](
             data=User(
                 uid=record.uid,
@@ -248,10 +352,12 @@ def profile_user(
 
 
 @user_router.get("/address", response_model=BaseResponse[list[UserAddress]])
-def all_address(
-    user: User = Depends(get_current_user), db: Session = Depends(get_db)
+async def all_address(
+    user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)
 ) -> StandardResponse[list[UserAddress]]:
-    record = db.query(AddressDb).filter(AddressDb.uid == user.uid).all()
+    record = (
+        await db.scalars(select(AddressDb).where(AddressDb.uid == user.uid))
+    ).all()
 
     return StandardResponse[list[UserAddress]](
         status_code=200,
@@ -270,13 +376,13 @@ def all_address(
 
 
 @user_router.get("/address/{aid}", response_model=BaseResponse[UserAddress])
-def get_address(
+async def get_address(
     aid: UUID,
     _: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[UserAddress]:
     if (
-        record := db.query(AddressDb).filter(AddressDb.aid == aid.hex).first()
+        record := await db.scalar(select(AddressDb).where(AddressDb.aid == aid.hex))
     ) is not None:
         return StandardResponse[UserAddress](
             data=UserAddress(
@@ -291,11 +397,11 @@ def get_address(
 
 
 @user_router.post("/address", response_model=BaseResponse[str], status_code=201)
-def add_address(
+async def add_address(
     body: AddressBase,
     is_default: bool = False,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[str]:
     aid = uuid4().hex
     db.add(
@@ -308,51 +414,59 @@ def add_address(
         )
     )
     if is_default:
-        user_db = db.query(UserDb).filter(UserDb.uid == user.uid).first()
+        user_db = await db.scalar(select(UserDb).where(UserDb.uid == user.uid))
         if user_db:
             user_db.aid = aid
-    db.commit()
+    await db.commit()
+    if is_default:
+        await invalidate_user(user.uid)
 
     return StandardResponse[str](status_code=201, message="Address added", data=aid)
 
 
 @user_router.put("/address/{aid}", response_model=BaseResponse)
-def edit_address(
+async def edit_address(
     aid: UUID,
     body: AddressBase,
     is_default: bool = False,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
-    if (
-        record := (db.query(AddressDb).filter(AddressDb.aid == aid.hex))
-    ).first() is not None:
-        record.update(body.model_dump())  # type: ignore
+    if await db.scalar(select(AddressDb).where(AddressDb.aid == aid.hex)) is not None:
+        await db.execute(
+            update(AddressDb)
+            .where(AddressDb.aid == aid.hex)
+            .values(**body.model_dump())
+        )
 
         if is_default:
-            user_db = db.query(UserDb).filter(UserDb.uid == user.uid).first()
+            user_db = await db.scalar(select(UserDb).where(UserDb.uid == user.uid))
             if user_db:
                 user_db.aid = aid.hex
-        db.commit()
+        await db.commit()
+        if is_default:
+            await invalidate_user(user.uid)
 
         return StandardResponse[None](message="Address updated")
     raise ExceptionResponseEnum.NOT_FOUND()
 
 
 @user_router.delete("/address/{aid}", response_model=BaseResponse)
-def remove_address(
+async def remove_address(
     aid: UUID,
     _: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> StandardResponse[None]:
     if (
-        record := db.query(AddressDb).filter(AddressDb.aid == aid.hex).first()
+        record := await db.scalar(select(AddressDb).where(AddressDb.aid == aid.hex))
     ) is not None:
         if (
-            user_db := db.query(UserDb).filter(UserDb.aid == aid.hex).first()
+            user_db := await db.scalar(select(UserDb).where(UserDb.aid == aid.hex))
         ) is not None and user_db.aid == aid.hex:
             user_db.aid = None
-        db.delete(record)
-        db.commit()
+        await db.delete(record)
+        await db.commit()
+        if user_db is not None:
+            await invalidate_user(user_db.uid)
         return StandardResponse[None](message="Address deleted")
     raise ExceptionResponseEnum.NOT_FOUND()
@@ -1,4 +1,77 @@
 from aiocache import Cache
-from aiocache.serializers import JsonSerializer
+from aiocache.base import BaseCache
+from aiocache.serializers import JsonSerializer, MsgPackSerializer, PickleSerializer
 
-cache = Cache(Cache.MEMORY, serializer=JsonSerializer())
+from Services.Cache.invalidation import InvalidationBus
+from Services.Config.config import CacheConfig, InvalidConfigError, config
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed by the msgpack serializer
+    msgpack = None
+
+
+class RawMsgPackSerializer(MsgPackSerializer):
+    """
+    Raw MsgPack Serializer
+    ~~~~~~~~~~~~~~~~~~~~~~
+    aiocache asks the backend to utf-8 decode msgpack payloads, which fails on
+    binary data. Read raw bytes and only decode strings inside the payload.
+    """
+
+    DEFAULT_ENCODING = None
+
+    def loads(self, value):
+        if value is None:
+            return None
+        return msgpack.loads(value, raw=False, use_list=self.use_list)
+
+
+SERIALIZERS = {
+    "json": JsonSerializer,
+    "msgpack": RawMsgPackSerializer,
+    "pickle": PickleSerializer,
+}
+
+
+def _build_key(key: str, namespace: str | None = None) -> str:
+    # the same "<namespace>:<key>" layout on every backend
+    return f"{namespace}:{key}" if namespace else key
+
+
+def create_cache(settings: CacheConfig) -> BaseCache:
+    options = {
+        "namespace": settings.namespace,
+        "key_builder": _build_key,
+        "serializer": SERIALIZERS[settings.serializer](),
+    }
+    match settings.backend:
+        case "memory":
+            return Cache(Cache.MEMORY, **options)
+        case "redis":
+            if Cache.REDIS is None:
+                raise InvalidConfigError("Redis cache requires shop-be[redis]")
+            return Cache(
+                Cache.REDIS,
+                endpoint=settings.host,
+                port=settings.port or 6379,
+                db=settings.db,
+                password=settings.password,
+                pool_max_size=settings.pool_size,
+                create_connection_timeout=settings.timeout,
+                **options,
+            )
+        case "memcached":
+            if Cache.MEMCACHED is None:
+                raise InvalidConfigError("Memcached cache requires shop-be[memcached]")
+            return Cache(
+                Cache.MEMCACHED,
+                endpoint=settings.host,
+                port=settings.port or 11211,
+                pool_size=settings.pool_size,
+                **options,
+            )
+
+
+cache = create_cache(config.cache)
+invalidation = InvalidationBus(cache, f"{config.cache.namespace}:invalidate")
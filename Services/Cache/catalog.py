@@ -0,0 +1,40 @@
+from uuid import uuid4
+
+from Services.Cache.cache import cache, invalidation
+from Services.Cache.tiered import TieredCache
+from Services.Config.config import config
+
+# item:<cid>     serialized /shop/item response
+# summary:<cid>  listing entry of one commodity
+# list:<generation>:<params>  cids and next cursor of one listing page
+# generation     changes whenever a commodity is added or removed
+catalog_cache = TieredCache(
+    "catalog",
+    cache,
+    invalidation,
+    config.cache.catalog_size,
+    config.cache.catalog_ttl,
+    config.cache.catalog_shared_ttl,
+    config.cache.fill_lease,
+)
+
+
+async def listing_generation() -> str:
+    if (generation := await catalog_cache.get("generation")) is None:
+        generation = uuid4().hex
+        try:
+            await catalog_cache.add("generation", generation)
+        except ValueError:
+            # another worker picked one first
+            if (generation := await catalog_cache.get("generation")) is None:
+                raise
+    return generation
+
+
+async def invalidate_commodity(cid: str, membership: bool = False) -> None:
+    # an edit only touches the entries of the commodity itself, listing pages
+    # are assembled from summaries and keep their membership
+    keys = [f"item:{cid}", f"summary:{cid}"]
+    if membership:
+        keys.append("generation")
+    await catalog_cache.delete(*keys)
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+
+from fastapi import Request, Response, status
+
+# blobs are never rewritten under the same fid, clients may keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+# anything else may be stored but has to be revalidated before each use
+REVALIDATE = "no-cache"
+
+
+def content_etag(body: bytes | str) -> str:
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return f'"{blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def validators(
+    etag: str, last_modified: datetime | None = None, cache_control: str = REVALIDATE
+) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def _modified_since(request: Request, headers: dict[str, str]) -> bool:
+    if (since := request.headers.get("if-modified-since")) is None or (
+        modified := headers.get("Last-Modified")
+    ) is None:
+        return True
+    try:
+        since_time = parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return True
+    # dates without a zone are not HTTP dates
+    if since_time.tzinfo is None:
+        return True
+    return parsedate_to_datetime(modified) > since_time
+
+
+def not_modified(request: Request, headers: dict[str, str]) -> Response | None:
+    # If-None-Match takes precedence, If-Modified-Since is only consulted
+    # when the client sent no entity tags (RFC 9110 13.2.2)
+    if request.method not in ("GET", "HEAD"):
+        return None
+    if (match := request.headers.get("if-none-match")) is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in match.split(",")]
+        if "*" not in tags and headers["ETag"] not in tags:
+            return None
+    elif _modified_since(request, headers):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def json_response(request: Request, body: bytes | str) -> Response:
+    headers = validators(content_etag(body))
+    if (response := not_modified(request, headers)) is not None:
+        return response
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+from aiocache import Cache
+from aiocache.base import BaseCache
+
+if TYPE_CHECKING:
+    from Services.Cache.tiered import TieredCache
+
+log = logging.getLogger("cache")
+
+
+class InvalidationBus:
+    """
+    Invalidation Bus
+    ~~~~~~~~~~~~~~~~
+    Tells the other workers which keys to drop from their in-process tier.
+    Messages go over Redis pub/sub, other backends have no channel and only
+    evict locally, their in-process tier then relies on its TTL.
+    """
+
+    def __init__(self, cache: BaseCache, channel: str) -> None:
+        self.cache = cache
+        self.channel = channel
+        self.origin = uuid4().hex
+        self._tiers: dict[str, "TieredCache"] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return Cache.REDIS is not None and isinstance(self.cache, Cache.REDIS)
+
+    def register(self, tier: "TieredCache") -> None:
+        self._tiers[tier.name] = tier
+
+    async def publish(self, name: str, keys: list[str]) -> None:
+        if not self.enabled:
+            return
+        message = {"origin": self.origin, "name": name, "keys": keys}
+        await self.cache.client.publish(self.channel, json.dumps(message))
+
+    def receive(self, data: bytes | str) -> None:
+        message = json.loads(data)
+        if message["origin"] == self.origin:
+            return
+        if (tier := self._tiers.get(message["name"])) is not None:
+            tier.evict(message["keys"])
+
+    async def run(self) -> None:
+        if not self.enabled:
+            return
+        while True:
+            pubsub = self.cache.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # entries cached while disconnected may have missed an eviction
+                for tier in self._tiers.values():
+                    tier.local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.receive(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Cache invalidation channel lost, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from time import monotonic
+
+from Models.metrics import CacheStats
+
+
+class LRUCache[K, V]:
+    """
+    LRU Cache
+    ~~~~~~~~~
+    In-process cache bounded by entry count, entries older than ``ttl``
+    seconds are treated as misses. A ``ttl`` of 0 disables expiry. Given
+    ``sizeof``, ``maxsize`` bounds the total bytes of the values instead and
+    a value larger than that is never cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float = 0,
+        sizeof: Callable[[V], int] | None = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # entry count, or total bytes with sizeof
+        self.weight = 0
+        self.evicted_weight = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def _weight(self, value: V) -> int:
+        return self.sizeof(value) if self.sizeof is not None else 1
+
+    def _discard(self, key: K) -> tuple[float, V] | None:
+        if (entry := self._data.pop(key, None)) is not None:
+            self.weight -= self._weight(entry[1])
+        return entry
+
+    def get(self, key: K) -> V | None:
+        if (entry := self._data.get(key)) is None:
+            self.misses += 1
+            return None
+        if self.ttl and monotonic() - entry[0] > self.ttl:
+            self._discard(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: K, value: V) -> None:
+        if (weight := self._weight(value)) > self.maxsize:
+            return
+        self._discard(key)
+        self._data[key] = (monotonic(), value)
+        self.weight += weight
+        while self.weight > self.maxsize:
+            _, (_, evicted) = self._data.popitem(last=False)
+            freed = self._weight(evicted)
+            self.weight -= freed
+            self.evicted_weight += freed
+            self.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        entry = self._discard(key)
+        return entry[1] if entry is not None else None
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.weight = 0
+
+    def __len__(self) -> int:
+        return self._data.__len__()
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def stats(self) -> CacheStats:
+        lookups = self.hits + self.misses
+        stats = CacheStats(
+            size=self._data.__len__(),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=self.hits / lookups if lookups else 0,
+        )
+        if self.sizeof is not None:
+            stats.maxsize = None
+            stats.bytes = self.weight
+            stats.maxbytes = self.maxsize
+            stats.evicted_bytes = self.evicted_weight
+        return stats
@@ -0,0 +1,139 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from time import monotonic
+from typing import Any
+
+from aiocache.base import BaseCache
+
+from Models.metrics import CacheStats
+from Services.Cache.invalidation import InvalidationBus
+from Services.Cache.lru import LRUCache
+from Services.Concurrency.concurrency import SingleFlight
+
+
+class TieredCache:
+    """
+    Tiered Cache
+    ~~~~~~~~~~~~
+    Bounded in-process LRU (L1) in front of the shared cache (L2). Deleting a
+    key evicts it from L2 and from the L1 of every worker through the
+    invalidation bus. Values must be accepted by the shared serializer, None
+    means absent and is never cached. Every delete bumps a version of the key
+    in L2, a fill that read its value before the delete does not publish it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        shared: BaseCache,
+        bus: InvalidationBus,
+        maxsize: int,
+        ttl: float,
+        shared_ttl: int | None = None,
+        lease: int = 3,
+    ) -> None:
+        self.name = name
+        self.shared = shared
+        self.bus = bus
+        self.shared_ttl = shared_ttl
+        self.lease = lease
+        self.local = LRUCache[str, Any](maxsize, ttl)
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self._fills = SingleFlight[str, Any | None]()
+        bus.register(self)
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _version_key(self, key: str) -> str:
+        return f"{self._key(key)}:version"
+
+    async def version(self, key: str) -> int:
+        # incrementing by 0 reads the counter on every backend, whatever the
+        # serializer of the cached values
+        return await self.shared.increment(self._version_key(key), 0)
+
+    async def get(self, key: str) -> Any | None:
+        if (value := self.local.get(key)) is not None:
+            return value
+        if (value := await self.shared.get(self._key(key))) is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any, version: int | None = None) -> bool:
+        # given the version read before the value was, the value is dropped
+        # when the key has been deleted since
+        if version is not None and await self.version(key) != version:
+            return False
+        await self.shared.set(self._key(key), value, ttl=self.shared_ttl)
+        if version is not None and await self.version(key) != version:
+            # a delete ran between the check and the write, it wins
+            await self.shared.delete(self._key(key))
+            return False
+        self.local.set(key, value)
+        return True
+
+    async def add(self, key: str, value: Any) -> None:
+        # raises ValueError when the key already exists in the shared tier
+        await self.shared.add(self._key(key), value, ttl=self.shared_ttl)
+        self.local.set(key, value)
+
+    async def get_or_set(
+        self, key: str, factory: Callable[[], Awaitable[Any | None]]
+    ) -> Any | None:
+        # stampede guard: one fill per key in this worker, other callers await it
+        if (value := await self.get(key)) is not None:
+            return value
+        return await self._fills.run(key, lambda: self._fill(key, factory))
+
+    async def _fill(
+        self, key: str, factory: Callable[[], Awaitable[Any | None]]
+    ) -> Any | None:
+        # across workers a short lease in the shared cache elects the filler,
+        # the others poll for its result until the lease runs out
+        lock = f"{self._key(key)}:lock"
+        try:
+            await self.shared.add(lock, self.bus.origin, ttl=self.lease)
+        except ValueError:
+            deadline = monotonic() + self.lease
+            while monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                if (value := await self.shared.get(self._key(key))) is not None:
+                    self.local.set(key, value)
+                    return value
+                if not await self.shared.exists(lock):
+                    break
+
+        try:
+            version = await self.version(key)
+            if (value := await factory()) is not None:
+                await self.set(key, value, version)
+            return value
+        finally:
+            await self.shared.delete(lock)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            await self.shared.increment(self._version_key(key))
+            await self.shared.delete(self._key(key))
+        self.evict(list(keys))
+        await self.bus.publish(self.name, list(keys))
+
+    def evict(self, keys: list[str]) -> None:
+        for key in keys:
+            self.local.pop(key)
+
+    def stats(self) -> dict[str, CacheStats]:
+        lookups = self.shared_hits + self.shared_misses
+        return {
+            f"{self.name}.l1": self.local.stats(),
+            f"{self.name}.l2": CacheStats(
+                hits=self.shared_hits,
+                misses=self.shared_misses,
+                hit_rate=self.shared_hits / lookups if lookups else 0,
+            ),
+        }
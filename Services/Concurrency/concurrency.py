@@ -0,0 +1,66 @@
+import asyncio
+import multiprocessing
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ProcessPool:
+    """
+    Process Pool
+    ~~~~~~~~~~~~
+    Runs CPU bound functions, which would hold the GIL and stall the event
+    loop, in ``workers`` spawned processes started on first use. At most
+    ``limit`` calls are queued at once, the others wait their turn here.
+    """
+
+    def __init__(self, workers: int, limit: int) -> None:
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # forking a process that already runs the event loop threads may deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run[T](self, func: Callable[..., T], *args) -> T:
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), func, *args
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+class SingleFlight[K, V]:
+    """
+    Single Flight
+    ~~~~~~~~~~~~~
+    One call per key at a time, concurrent callers of the same key await the
+    call in flight and share its result or exception. The call runs in a
+    task of its own: a cancelled caller only stops waiting, the call goes on
+    for the others.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[K, asyncio.Task[V]] = {}
+
+    def _done(self, key: K, task: asyncio.Task[V]) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # a failure nobody was left waiting for is not worth a warning
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: K, factory: Callable[[], Awaitable[V]]) -> V:
+        if (task := self._tasks.get(key)) is None or task.done():
+            task = self._tasks[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
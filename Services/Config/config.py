@@ -1,6 +1,7 @@
 import json
 import os
 from pathlib import Path
+from typing import Literal
 
 import toml
 from pydantic import BaseModel
@@ -22,6 +23,11 @@ class InvalidConfigError(Exception):
 
 class SecurityConfig(BaseModel):
     secret_key: str
+    stateless: bool = False
+    revocation_refresh: float = 10
+    bcrypt_rounds: int = 12
+    bcrypt_workers: int = 2
+    bcrypt_concurrency: int = 16
 
 
 class DataBaseConfig(BaseModel):
@@ -30,6 +36,17 @@ class DataBaseConfig(BaseModel):
     name: str
     username: str
     password: str
+    driver: str = "asyncmy"
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    pool_use_lifo: bool = False
+    replicas: list[str] = []
+    replica_retry: int = 30
+    replica_sticky: int = 5
+    migration_lock: int = 300
 
 
 class EmailConfig(BaseModel):
@@ -39,6 +56,58 @@ class EmailConfig(BaseModel):
     password: str
 
 
+class CacheConfig(BaseModel):
+    backend: Literal["memory", "redis", "memcached"] = "memory"
+    host: str = "127.0.0.1"
+    port: int | None = None
+    db: int = 0
+    password: str | None = None
+    pool_size: int = 10
+    timeout: float | None = None
+    namespace: str = "shop"
+    serializer: Literal["json", "msgpack", "pickle"] = "json"
+    user_size: int = 4096
+    user_ttl: float = 60
+    user_shared_ttl: int = 300
+    catalog_size: int = 4096
+    catalog_ttl: float = 30
+    catalog_shared_ttl: int = 300
+    fill_lease: int = 3
+
+
+class S3Config(BaseModel):
+    bucket: str
+    prefix: str = ""
+    endpoint: str | None = None
+    region: str | None = None
+    access_key: str | None = None
+    secret_key: str | None = None
+    pool_size: int = 10
+    multipart_threshold: int = 1024 * 1024 * 8
+    multipart_size: int = 1024 * 1024 * 8
+    presign: bool = False
+    presign_expiry: int = 3600
+
+
+class StorageConfig(BaseModel):
+    backend: Literal["local", "s3"] = "local"
+    s3: S3Config | None = None
+    content_addressed: bool = True
+    file_size: int = 1024 * 1024 * 10
+    request_size: int = 1024 * 1024 * 25
+    chunk_size: int = 1024 * 64
+    cache_size: int = 1024 * 1024 * 64
+    cache_file_size: int = 1024 * 1024
+    variant_widths: list[int] = [200, 400, 800, 1600]
+    variant_formats: list[Literal["avif", "webp"]] = ["avif", "webp"]
+    variant_quality: int = 75
+    variant_workers: int = 2
+    gc_interval: int = 3600
+    gc_grace: int = 3600
+    gc_rate: float = 50
+    gc_dry_run: bool = False
+
+
 class LogConfig(BaseModel):
     log_level: str
 
@@ -52,6 +121,8 @@ class Config(BaseModel):
     security: SecurityConfig
     database: DataBaseConfig
     email: EmailConfig
+    cache: CacheConfig = CacheConfig()
+    storage: StorageConfig = StorageConfig()
     log: LogConfig = LogConfig(log_level="INFO")
     test: TestConfig | None = None
 
@@ -1,21 +1,87 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from fastapi import Request
+from sqlalchemy import MetaData, event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
+from Models.metrics import PoolStatus
 from Services.Config.config import config
+from Services.Database.pool import MeteredQueuePool
+from Services.Database.replica import PRIMARY_COOKIE, ReplicaSet
 
-engine = create_engine(
-    f"mysql://{config.database.username}:{config.database.password}@{config.database.host}:{config.database.port}/{config.database.name}",
-    connect_args={"connect_timeout": 10},
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        connect_args={"connect_timeout": 10},
+        poolclass=MeteredQueuePool,
+        pool_size=config.database.pool_size,
+        max_overflow=config.database.max_overflow,
+        pool_timeout=config.database.pool_timeout,
+        pool_recycle=config.database.pool_recycle,
+        pool_pre_ping=config.database.pool_pre_ping,
+        pool_use_lifo=config.database.pool_use_lifo,
+    )
+
+
+engine = _create_engine(
+    f"mysql+{config.database.driver}://{config.database.username}:{config.database.password}@{config.database.host}:{config.database.port}/{config.database.name}"
+)
+replicas = ReplicaSet(
+    [_create_engine(dsn) for dsn in config.database.replicas],
+    retry=config.database.replica_retry,
 )
 
 
-SessionLocal = sessionmaker(autocommit=False, bind=engine, expire_on_commit=True)
-Base = declarative_base()
+SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+Base = declarative_base(
+    metadata=MetaData(
+        naming_convention={
+            "ix": "ix_%(column_0_label)s",
+            "uq": "uq_%(table_name)s_%(column_0_name)s",
+        }
+    )
+)
 
 
-def get_db():
-    database = SessionLocal()
-    try:
+async def get_db(request: Request):
+    async with SessionLocal() as database:
+        event.listen(
+            database.sync_session,
+            "after_commit",
+            lambda _: setattr(request.state, "db_written", True),
+        )
         yield database
-    finally:
-        database.close()
+
+
+async def get_read_db(request: Request):
+    # Clients which just wrote read from the primary until the cookie expires
+    if PRIMARY_COOKIE in request.cookies or (replica := replicas.pick()) is None:
+        async with SessionLocal() as database:
+            yield database
+        return
+
+    index, replica_engine = replica
+    try:
+        async with SessionLocal(bind=replica_engine) as database:
+            yield database
+    except (exc.InterfaceError, exc.OperationalError, OSError) as error:
+        # the request fails, the following ones skip the replica for a while
+        replicas.failed(index, error)
+        raise
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    for replica in replicas.engines:
+        await replica.dispose()
+
+
+def pool_status() -> dict[str, PoolStatus]:
+    assert isinstance(engine.pool, MeteredQueuePool)
+    status = {"primary": engine.pool.metrics()}
+    for index, replica in enumerate(replicas.engines):
+        assert isinstance(replica.pool, MeteredQueuePool)
+        status[f"replica-{index}"] = replica.pool.metrics().model_copy(
+            update={"available": replicas.is_available(index)}
+        )
+    return status
@@ -0,0 +1,55 @@
+import logging
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from Models.database import Base
+from Services.Config.config import config
+from Services.Database.database import engine
+
+alembic_ini = Path(__file__).parents[2].joinpath("alembic.ini")
+logger = logging.getLogger("migration")
+
+MIGRATION_LOCK = "shop:migration"
+
+
+def upgrade_schema(connection: Connection, revision: str) -> None:
+    alembic_config = AlembicConfig(alembic_ini)
+    alembic_config.attributes["connection"] = connection
+    command.upgrade(alembic_config, revision)
+
+
+def drop_schema(connection: Connection) -> None:
+    Base.metadata.drop_all(connection)
+    connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+
+async def init_db(revision: str = "head") -> None:
+    # every worker migrates on startup, MySQL DDL is not transactional so an
+    # advisory lock lets one at a time in, the others find the schema at head
+    async with engine.connect() as lock:
+        if (
+            engine.dialect.name == "mysql"
+            and (
+                await lock.scalar(
+                    text("SELECT GET_LOCK(:name, :timeout)"),
+                    {"name": MIGRATION_LOCK, "timeout": config.database.migration_lock},
+                )
+            )
+            != 1
+        ):
+            raise TimeoutError("Timed out waiting for another worker to migrate")
+        try:
+            async with engine.begin() as conn:
+                if config.test is not None and config.test.is_test:
+                    logger.warning("Test mode enabled, dropping all tables")
+                    await conn.run_sync(drop_schema)
+                await conn.run_sync(upgrade_schema, revision)
+        finally:
+            if engine.dialect.name == "mysql":
+                await lock.execute(
+                    text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK}
+                )
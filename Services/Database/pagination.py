@@ -0,0 +1,50 @@
+import base64
+import json
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from sqlalchemy import ColumnElement, UnaryExpression, and_, or_
+
+from Models.response import ExceptionResponseEnum, SortOrder
+
+
+def encode_cursor(*keys: str | int | float) -> str:
+    return base64.urlsafe_b64encode(json.dumps(keys).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, *types: Callable[[Any], Any]) -> list[Any]:
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(keys, list) or len(keys) != len(types):
+            raise ValueError
+        return [convert(key) for convert, key in zip(types, keys)]
+    except (ValueError, TypeError):
+        raise ExceptionResponseEnum.INVALID_OPERATION()
+
+
+def order_by(
+    columns: Sequence[ColumnElement], order: SortOrder
+) -> list[UnaryExpression]:
+    return [
+        column.asc() if order == SortOrder.ASC else column.desc() for column in columns
+    ]
+
+
+def after(
+    columns: Sequence[ColumnElement], keys: Sequence[Any], order: SortOrder
+) -> ColumnElement[bool]:
+    # Expanded to `a > x OR (a = x AND b > y)` so MySQL can range scan the index
+    clauses = []
+    for index, column in enumerate(columns):
+        equal = [prefix == key for prefix, key in zip(columns[:index], keys)]
+        clauses.append(
+            and_(
+                *equal,
+                (
+                    column > keys[index]
+                    if order == SortOrder.ASC
+                    else column < keys[index]
+                ),
+            )
+        )
+    return or_(*clauses)
@@ -0,0 +1,48 @@
+from time import perf_counter
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+from Models.metrics import PoolStatus
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Metered Queue Pool
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Queue pool which records how long each checkout waits for a connection.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def connect(self) -> PoolProxiedConnection:
+        start = perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def metrics(self) -> PoolStatus:
+        return PoolStatus(
+            size=self.size(),
+            checked_out=self.checkedout(),
+            idle=self.checkedin(),
+            overflow=max(self.overflow(), 0),
+            checkouts=self.checkouts,
+            timeouts=self.timeouts,
+            wait_avg_ms=(
+                self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0
+            ),
+            wait_max_ms=self.wait_max * 1000,
+        )
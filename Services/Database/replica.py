@@ -0,0 +1,70 @@
+import logging
+from time import monotonic
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PRIMARY_COOKIE = "db_primary"
+logger = logging.getLogger("database")
+
+
+class ReplicaSet:
+    """
+    Replica Set
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Hands out read replica engines in round-robin order. A replica whose
+    connection failed is skipped for `retry` seconds.
+    """
+
+    def __init__(self, engines: list[AsyncEngine], retry: float) -> None:
+        self.engines = engines
+        self.retry = retry
+        self._next = 0
+        self._down_until = [0.0] * len(engines)
+
+    def pick(self) -> tuple[int, AsyncEngine] | None:
+        # no connection is checked out here, sessions connect on first use
+        for _ in range(len(self.engines)):
+            index = self._next
+            self._next = (index + 1) % len(self.engines)
+            if self.is_available(index):
+                return index, self.engines[index]
+        return None
+
+    def failed(self, index: int, error: BaseException) -> None:
+        logger.warning(f"Replica {index} unavailable, skipped: {error}")
+        self._down_until[index] = monotonic() + self.retry
+
+    def is_available(self, index: int) -> bool:
+        return self._down_until[index] <= monotonic()
+
+
+class PrimaryStickiness:
+    """
+    Primary Stickiness Middleware
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Sets a short-lived cookie on responses to requests which committed to
+    the primary, so the client's following reads skip the replicas until
+    replication has caught up.
+    """
+
+    def __init__(self, app: ASGIApp, max_age: int) -> None:
+        self.app = app
+        self.cookie = (
+            f"{PRIMARY_COOKIE}=1; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and scope.get("state", {}).get(
+                "db_written"
+            ):
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,23 +1,88 @@
-# -*- author: abdusco<https://github.com/abdusco> -*-
-from starlette import status
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+import re
+
+from fastapi import HTTPException
 from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import ASGIApp
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from Models.response import ExceptionResponseEnum, http_exception_handler
+
 
+class LimitUploadSize:
+    """
+    Upload Size Limit Middleware
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Rejects request bodies larger than ``max_upload_size`` bytes with 413.
+    ``limits`` overrides it per route, keyed by method and path template
+    such as ``"PUT /shop/item/{cid}"``. A declared Content-Length is checked
+    up front, bodies without one (chunked uploads) are counted as they are
+    received and aborted once they pass the limit.
+    """
 
-class LimitUploadSize(BaseHTTPMiddleware):
-    def __init__(self, app: ASGIApp, max_upload_size: int) -> None:
-        super().__init__(app)
+    def __init__(
+        self, app: ASGIApp, max_upload_size: int, limits: dict[str, int] | None = None
+    ) -> None:
+        self.app = app
         self.max_upload_size = max_upload_size
+        self.limits: list[tuple[str, re.Pattern, int]] = []
+        for route, limit in (limits or {}).items():
+            method, path = route.split(" ", 1)
+            self.limits.append((method.upper(), compile_path(path)[0], limit))
+
+    def limit(self, scope: Scope) -> int:
+        for method, pattern, limit in self.limits:
+            if scope["method"] == method and pattern.match(scope["path"]):
+                return limit
+        return self.max_upload_size
+
+    async def reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = await http_exception_handler(
+            Request(scope), ExceptionResponseEnum.TOO_LARGE()
+        )
+        # the client may still be sending, it should not reuse the connection
+        response.headers["Connection"] = "close"
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit(scope)
+        length = next(
+            (value for key, value in scope["headers"] if key == b"content-length"),
+            None,
+        )
+        if length is not None:
+            # the server never passes on more than the declared length
+            if not length.isdigit() or int(length) > limit:
+                await self.reject(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+            return
+
+        received = 0
+        started = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += message.get("body", b"").__len__()
+                if received > limit:
+                    raise ExceptionResponseEnum.TOO_LARGE()
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
 
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        if request.method == "POST":
-            if "content-length" not in request.headers:
-                return Response(status_code=status.HTTP_411_LENGTH_REQUIRED)
-            content_length = int(request.headers["content-length"])
-            if content_length > self.max_upload_size:
-                return Response(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
-        return await call_next(request)
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except HTTPException:
+            # raised from receive() where no exception handler of the
+            # application caught it
+            if received <= limit or started:
+                raise
+            await self.reject(scope, receive, send)
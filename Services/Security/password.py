@@ -0,0 +1,43 @@
+import bcrypt
+
+from Services.Concurrency.concurrency import ProcessPool
+from Services.Config.config import config
+
+# bcrypt holds the GIL for the whole ~250 ms of a round
+_pool = ProcessPool(config.security.bcrypt_workers, config.security.bcrypt_concurrency)
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _verify(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+async def hash_password(password: str) -> str:
+    hashed = await _pool.run(
+        _hash, bytes(password, "utf-8"), config.security.bcrypt_rounds
+    )
+    return hashed.decode("utf-8")
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await _pool.run(
+            _verify, bytes(password, "utf-8"), bytes(hashed, "utf-8")
+        )
+    except ValueError:
+        return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    # $2b$<rounds>$<salt and hash>
+    try:
+        return int(hashed.split("$")[2]) != config.security.bcrypt_rounds
+    except (IndexError, ValueError):
+        return True
+
+
+def shutdown_executor() -> None:
+    _pool.shutdown()
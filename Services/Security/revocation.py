@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from Models.database import UserDb
+from Services.Database.database import SessionLocal
+
+log = logging.getLogger("security")
+
+
+class RevocationList:
+    """
+    Revocation List
+    ~~~~~~~~~~~~~~~
+    Lowest accepted token version of every user whose tokens were revoked
+    within ``window``, older revocations cannot match an unexpired token.
+    Reloaded from the database every ``interval`` seconds by ``run``.
+    """
+
+    def __init__(self, window: timedelta, interval: float) -> None:
+        self.window = window
+        self.interval = interval
+        self._versions: dict[str, int] = {}
+        self._pending: dict[str, int] = {}
+
+    def revoke(self, uid: str, version: int) -> None:
+        for versions in (self._versions, self._pending):
+            versions[uid] = max(versions.get(uid, 0), version)
+
+    def is_revoked(self, uid: str, version: int) -> bool:
+        return version < self._versions.get(uid, 0)
+
+    def __len__(self) -> int:
+        return self._versions.__len__()
+
+    async def refresh(self) -> None:
+        # revocations made while the query runs may be missing from its result
+        self._pending = {}
+        async with SessionLocal() as db:
+            record = await db.execute(
+                select(UserDb.uid, UserDb.token_version).where(
+                    UserDb.token_revoked_at > datetime.now() - self.window
+                )
+            )
+            versions = {uid: version for uid, version in record}
+        for uid, version in self._pending.items():
+            versions[uid] = max(versions.get(uid, 0), version)
+        self._versions = versions
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                log.exception("Failed to refresh the token revocation list")
+            await asyncio.sleep(self.interval)
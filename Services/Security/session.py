@@ -0,0 +1,69 @@
+import secrets
+from datetime import datetime, timedelta
+from hashlib import sha256
+from uuid import uuid4
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Models.database import SessionDb
+from Models.response import ExceptionResponseEnum
+
+REFRESH_TOKEN_EXPIRE_DAYS = 30
+
+
+def hash_token(token: str) -> str:
+    # refresh tokens are random 256 bit strings, a fast unsalted hash is enough
+    return sha256(token.encode("utf-8")).hexdigest()
+
+
+async def create_session(db: AsyncSession, uid: str, user_agent: str | None) -> str:
+    now = datetime.now()
+    await db.execute(
+        delete(SessionDb).where(SessionDb.uid == uid, SessionDb.expires < now)
+    )
+
+    token = secrets.token_urlsafe(32)
+    db.add(
+        SessionDb(
+            sid=uuid4().hex,
+            uid=uid,
+            token_hash=hash_token(token),
+            previous_hash=None,
+            user_agent=user_agent[:255] if user_agent else None,
+            created=now,
+            last_used=now,
+            expires=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    return token
+
+
+async def rotate_session(db: AsyncSession, token: str) -> tuple[SessionDb, str]:
+    hashed = hash_token(token)
+    if (
+        record := await db.scalar(
+            select(SessionDb).where(SessionDb.token_hash == hashed).with_for_update()
+        )
+    ) is None:
+        # a rotated token presented again has leaked, end the session it belonged to
+        await db.execute(delete(SessionDb).where(SessionDb.previous_hash == hashed))
+        await db.commit()
+        raise ExceptionResponseEnum.AUTH_FAILED()
+
+    now = datetime.now()
+    if record.expires < now:
+        await db.delete(record)
+        await db.commit()
+        raise ExceptionResponseEnum.AUTH_FAILED()
+
+    token = secrets.token_urlsafe(32)
+    record.previous_hash = hashed
+    record.token_hash = hash_token(token)
+    record.last_used = now
+    record.expires = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return record, token
+
+
+async def revoke_sessions(db: AsyncSession, uid: str) -> None:
+    await db.execute(delete(SessionDb).where(SessionDb.uid == uid))
@@ -4,20 +4,36 @@ import jwt
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from jwt import InvalidTokenError
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from Models.database import UserDb
 from Models.response import ExceptionResponseEnum
-from Models.user import Gender, Permission, TokenData, User
+from Models.user import Gender, Permission, TokenData, User, UserIdentity
+from Services.Cache.cache import cache, invalidation
+from Services.Cache.tiered import TieredCache
 from Services.Config.config import config
 from Services.Database.database import get_db
 from Services.Log.logger import logging
+from Services.Security.revocation import RevocationList
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="user/login")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 SECRET_KEY = config.security.secret_key
 log = logging.getLogger("security")
+user_cache = TieredCache(
+    "user",
+    cache,
+    invalidation,
+    config.cache.user_size,
+    config.cache.user_ttl,
+    config.cache.user_shared_ttl,
+)
+revocations = RevocationList(
+    timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), config.security.revocation_refresh
+)
 
 
 def create_access_token(data: TokenData, expires_delta: timedelta | None = None) -> str:
@@ -31,34 +47,93 @@ def create_access_token(data: TokenData, expires_delta: timedelta | None = None)
     return encoded_jwt
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
+def create_user_token(user: UserDb) -> str:
+    return create_access_token(
+        data=TokenData(
+            sub=user.uid,
+            id=user.uid,
+            permission=user.permission,
+            version=user.token_version,
+        ),
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+
+def decode_token(token: str) -> TokenData:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        uid: str = payload["id"]
-        if uid is None:
+        return TokenData.model_validate(
+            jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        )
+    except (InvalidTokenError, ValidationError):
+        raise ExceptionResponseEnum.AUTH_FAILED()
+
+
+async def load_user(data: TokenData, db: AsyncSession) -> User:
+    if (cached := await user_cache.get(data.id)) is None:
+        # read before the row, a row invalidated meanwhile is not cached
+        version = await user_cache.version(data.id)
+        user: UserDb | None = await db.scalar(
+            select(UserDb).where(UserDb.uid == data.id)
+        )
+        if user is None:
             raise ExceptionResponseEnum.AUTH_FAILED()
-    except InvalidTokenError:
+
+        cached = {
+            "user": User(
+                uid=user.uid,
+                username=user.username,
+                email=user.email,
+                permission=Permission(user.permission),
+                gender=Gender(user.gender),
+                birthday=user.birthday,
+                aid=user.aid,
+            ).model_dump(mode="json"),
+            "version": user.token_version,
+        }
+        await user_cache.set(data.id, cached, version)
+
+    # tokens issued before token versions existed carry none
+    if data.version is not None and data.version != cached["version"]:
         raise ExceptionResponseEnum.AUTH_FAILED()
+    return User.model_validate(cached["user"])
+
 
-    user: UserDb | None = db.query(UserDb).filter(UserDb.uid == uid).first()
-    if user is None:
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    return await load_user(decode_token(token), db)
+
+
+async def get_current_identity(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> UserIdentity:
+    data = decode_token(token)
+    if not config.security.stateless or data.permission is None or data.version is None:
+        return await load_user(data, db)
+
+    # stateless mode trusts the signed claims, only revocations are checked
+    if revocations.is_revoked(data.id, data.version):
         raise ExceptionResponseEnum.AUTH_FAILED()
+    return UserIdentity(uid=data.id, permission=Permission(data.permission))
 
-    return User(
-        uid=user.uid,
-        username=user.username,
-        email=user.email,
-        permission=Permission(user.permission),
-        gender=Gender(user.gender),
-        birthday=user.birthday,
-        aid=user.aid,
-    )
+
+async def invalidate_user(uid: str, token_version: int | None = None) -> None:
+    # call after the change is committed, otherwise a concurrent request may
+    # cache the old row again
+    await user_cache.delete(uid)
+    # the list is only refreshed, and pruned, in stateless mode
+    if token_version is not None and config.security.stateless:
+        revocations.revoke(uid, token_version)
+
+
+def revoke_tokens(record: UserDb) -> None:
+    record.token_version += 1
+    record.token_revoked_at = datetime.now()
 
 
-def verify_user(user: User, permission: Permission) -> bool:
+def verify_user(user: UserIdentity, permission: Permission) -> bool:
     if user.permission < permission:
         raise ExceptionResponseEnum.PERMISSION_DENIED()
     return True
@@ -0,0 +1,185 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from pathlib import Path
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+from fastapi import Response
+from fastapi.responses import FileResponse
+
+from Services.Config.config import InvalidConfigError, StorageConfig, config
+
+data_path = Path(os.path.join(os.getcwd(), "Services/Storage/data"))
+
+
+class StorageBackend(ABC):
+    """
+    Storage Backend
+    ~~~~~~~~~~~~~~~
+    Where stored files live. Keys are "/" separated paths such as
+    ``blobs/ab/cd/<hash>``, files are written once and never modified.
+    """
+
+    # image requests are redirected to the backend instead of proxied
+    redirects: bool = False
+
+    @asynccontextmanager
+    async def staging(self) -> AsyncIterator[Path]:
+        # a local scratch file for put_file, removed when the block ends
+        path = Path(self.staging_path).joinpath(f"{uuid4().hex}.part")
+        try:
+            yield path
+        finally:
+            path.unlink(missing_ok=True)
+
+    @property
+    @abstractmethod
+    def staging_path(self) -> Path: ...
+
+    @abstractmethod
+    async def put_file(self, key: str, source: Path) -> None: ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool: ...
+
+    @abstractmethod
+    async def size(self, key: str) -> int | None: ...
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def local_copy(self, key: str) -> AbstractAsyncContextManager[Path]:
+        # a local path holding the file for as long as the block runs
+        ...
+
+    @abstractmethod
+    async def response(
+        self, key: str, mime: str, headers: dict[str, str], byte_range: str | None
+    ) -> Response | None: ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None: ...
+
+    @abstractmethod
+    def scan(self) -> AsyncIterator[tuple[str, int, float]]:
+        # key, size and modification time of every stored file
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStorage(StorageBackend):
+    """
+    Local Storage
+    ~~~~~~~~~~~~~
+    Files in a directory of this host. Files of the flat layout used before
+    sharding are found until ``Services.Storage.layout`` has moved them.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        if not root.exists():
+            root.mkdir(parents=True)
+
+    @property
+    def staging_path(self) -> Path:
+        # on the same file system, put_file is a single rename
+        return self.root
+
+    def _flat(self, key: str) -> Path | None:
+        # blobs/ab/cd/<hash> was blobs/<hash>, files/ab/cd/<fid> was <fid>
+        parts = key.split("/")
+        if parts.__len__() != 4:
+            return None
+        if parts[0] == "files":
+            return self.root.joinpath(parts[3])
+        return self.root.joinpath(parts[0], parts[3])
+
+    def path(self, key: str) -> Path:
+        if not (path := self.root.joinpath(key)).exists() and (
+            (flat := self._flat(key)) is not None and flat.exists()
+        ):
+            return flat
+        return path
+
+    async def put_file(self, key: str, source: Path) -> None:
+        target = self.root.joinpath(key)
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        await aiofiles.os.replace(source, target)
+
+    async def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    async def size(self, key: str) -> int | None:
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    async def read(self, key: str) -> bytes | None:
+        try:
+            async with aiofiles.open(self.path(key), "rb") as f:
+                return await f.read()
+        except FileNotFoundError:
+            return None
+
+    @asynccontextmanager
+    async def local_copy(self, key: str) -> AsyncIterator[Path]:
+        if not (path := self.path(key)).exists():
+            raise FileNotFoundError(key)
+        yield path
+
+    async def response(
+        self, key: str, mime: str, headers: dict[str, str], byte_range: str | None
+    ) -> Response | None:
+        # streamed in chunks, FileResponse answers Range requests itself
+        try:
+            stat = (path := self.path(key)).stat()
+        except FileNotFoundError:
+            return None
+        return FileResponse(path, media_type=mime, headers=headers, stat_result=stat)
+
+    async def delete(self, key: str) -> None:
+        self.path(key).unlink(missing_ok=True)
+
+    async def _scan(self, directory: Path) -> AsyncIterator[os.DirEntry]:
+        # listing a directory blocks, large ones are read off the event loop
+        entries = await asyncio.to_thread(lambda: list(os.scandir(directory)))
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                async for item in self._scan(Path(entry.path)):
+                    yield item
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+    async def scan(self) -> AsyncIterator[tuple[str, int, float]]:
+        async for entry in self._scan(self.root):
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            key = Path(entry.path).relative_to(self.root).as_posix()
+            yield key, stat.st_size, stat.st_mtime
+
+
+def create_storage(settings: StorageConfig) -> StorageBackend:
+    match settings.backend:
+        case "local":
+            return LocalStorage(data_path)
+        case "s3":
+            from Services.Storage.s3 import S3Storage, aiobotocore
+
+            if aiobotocore is None:
+                raise InvalidConfigError("S3 storage requires shop-be[s3]")
+            if settings.s3 is None:
+                raise InvalidConfigError("S3 storage requires a [storage.s3] section")
+            return S3Storage(settings.s3)
+
+
+storage = create_storage(config.storage)
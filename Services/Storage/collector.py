@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Models.database import BlobDb, CommodityDb, FileDb
+from Models.metrics import StorageGcStatus
+from Services.Cache.cache import cache, invalidation
+from Services.Config.config import config
+from Services.Database.database import SessionLocal
+from Services.Storage.backend import storage
+from Services.Storage.manager import (
+    BLOBS,
+    FILES,
+    STORED_NAME,
+    VARIANTS,
+    image_cache,
+    remove_file,
+)
+
+log = logging.getLogger("storage")
+
+BATCH = 1000
+
+
+class StorageCollector:
+    """
+    Storage Collector
+    ~~~~~~~~~~~~~~~~~
+    Releases file records no commodity lists anymore, then deletes files on
+    storage that no record refers to. Anything younger than ``grace`` seconds
+    may belong to a request still in flight and is kept, deletions are paced
+    to ``rate`` per second. ``run`` collects every ``interval`` seconds.
+    """
+
+    def __init__(self, grace: int, rate: float, interval: int) -> None:
+        self.grace = grace
+        self.rate = rate
+        self.interval = interval
+        self.status = StorageGcStatus()
+        self._task: asyncio.Task | None = None
+
+    async def _referenced(self, db: AsyncSession) -> set[str]:
+        fids: set[str] = set()
+        last = ""
+        while rows := (
+            await db.execute(
+                select(CommodityDb.cid, CommodityDb.images)
+                .where(CommodityDb.cid > last)
+                .order_by(CommodityDb.cid)
+                .limit(BATCH)
+            )
+        ).all():
+            for _, images in rows:
+                fids.update(images)
+            last = rows[-1].cid
+        return fids
+
+    async def _release(self, dry_run: bool, cutoff: datetime) -> None:
+        async with SessionLocal() as db:
+            referenced = await self._referenced(db)
+            last = ""
+            while fids := (
+                await db.scalars(
+                    select(FileDb.fid)
+                    .where(FileDb.fid > last, FileDb.created < cutoff)
+                    .order_by(FileDb.fid)
+                    .limit(BATCH)
+                )
+            ).all():
+                last = fids[-1]
+                for fid in fids:
+                    if fid in referenced:
+                        continue
+                    self.status.released += 1
+                    if not dry_run:
+                        await remove_file(db, UUID(fid))
+                await db.commit()
+
+    def _orphan(self, key: str, fids: set[str], hashes: set[str]) -> bool:
+        # only names the storage writes itself, anything else is left alone
+        prefix, name = key.split("/", 1)[0], key.rsplit("/", 1)[-1]
+        if not STORED_NAME.fullmatch(name):
+            return False
+        if name.endswith(".part"):
+            return True
+        if prefix == name:
+            # a file of the flat layout
+            return name not in fids
+        if prefix == BLOBS:
+            return name not in hashes
+        if prefix == FILES:
+            return name not in fids
+        if prefix == VARIANTS:
+            source = name.split(".", 1)[0]
+            return source not in fids and source not in hashes
+        return False
+
+    async def _sweep(self, dry_run: bool, cutoff: float) -> None:
+        async with SessionLocal() as db:
+            fids = set(await db.scalars(select(FileDb.fid)))
+            hashes = set(await db.scalars(select(BlobDb.hash)))
+
+        async for key, size, modified in storage.scan():
+            self.status.scanned += 1
+            if self.status.scanned % BATCH == 0:
+                await asyncio.sleep(0)
+            if modified >= cutoff or not self._orphan(key, fids, hashes):
+                continue
+
+            self.status.removed += 1
+            self.status.freed += size
+            if not dry_run:
+                await storage.delete(key)
+                image_cache.pop(key.rsplit("/", 1)[-1])
+                if self.rate > 0:
+                    await asyncio.sleep(1 / self.rate)
+
+    def _begin(self, dry_run: bool) -> datetime:
+        now = datetime.now()
+        self.status = StorageGcStatus(running=True, dry_run=dry_run, started=now)
+        return now
+
+    async def _collect(self, dry_run: bool, started: datetime) -> StorageGcStatus:
+        # a dry run keeps the records it would release, their files are not
+        # counted as removable
+        cutoff = started - timedelta(seconds=self.grace)
+        try:
+            await self._release(dry_run, cutoff)
+            await self._sweep(dry_run, cutoff.timestamp())
+        except Exception:
+            log.exception("Storage collection failed")
+        finally:
+            self.status.running = False
+            self.status.finished = datetime.now()
+        log.info(
+            f"Storage collection {'(dry run) ' if dry_run else ''}scanned "
+            f"{self.status.scanned} files, released {self.status.released} "
+            f"records, removed {self.status.removed} files ({self.status.freed} bytes)"
+        )
+        return self.status
+
+    async def collect(self, dry_run: bool = False) -> StorageGcStatus:
+        return await self._collect(dry_run, self._begin(dry_run))
+
+    def start(self, dry_run: bool = False) -> bool:
+        # collects in the background, progress shows in ``status``
+        if self.status.running:
+            return False
+        self._task = asyncio.create_task(self._collect(dry_run, self._begin(dry_run)))
+        return True
+
+    async def run(self, dry_run: bool = False) -> None:
+        if self.interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # one worker collects per interval when the cache is shared
+                await cache.add("storage:gc", invalidation.origin, ttl=self.interval)
+            except ValueError:
+                continue
+            if not self.status.running:
+                await self.collect(dry_run)
+
+
+collector = StorageCollector(
+    config.storage.gc_grace, config.storage.gc_rate, config.storage.gc_interval
+)
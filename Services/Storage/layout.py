@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from Services.Storage.backend import data_path
+from Services.Storage.manager import BLOBS, FILES, STORED_NAME, VARIANTS, sharded
+
+log = logging.getLogger("storage")
+
+
+def _flat_files(directory: Path) -> list[Path]:
+    if not directory.exists():
+        return []
+    return [
+        Path(entry.path)
+        for entry in os.scandir(directory)
+        if entry.is_file(follow_symlinks=False)
+        and STORED_NAME.fullmatch(entry.name)
+        and not entry.name.endswith(".part")
+    ]
+
+
+async def migrate_layout(dry_run: bool = False, rate: float = 0) -> int:
+    # moves files of the flat layout into their shard, safe while serving:
+    # readers fall back to the flat path until the file is moved, and a move
+    # is a single rename. Only the local backend had a flat layout
+    moved = 0
+    for source, prefix in (
+        (data_path, FILES),
+        (data_path.joinpath(BLOBS), BLOBS),
+        (data_path.joinpath(VARIANTS), VARIANTS),
+    ):
+        for path in await asyncio.to_thread(_flat_files, source):
+            destination = data_path.joinpath(sharded(prefix, path.name))
+            if not dry_run:
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, destination)
+                if rate > 0:
+                    await asyncio.sleep(1 / rate)
+            moved += 1
+            if moved % 1000 == 0:
+                log.info(f"Moved {moved} files into the sharded layout")
+    log.info(f"{'Would move' if dry_run else 'Moved'} {moved} files in total")
+    return moved
+
+
+if __name__ == "__main__":
+    # uv run python -m Services.Storage.layout --dry-run
+    parser = argparse.ArgumentParser(description="Move stored files into shards")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--rate", type=float, default=0, help="files per second")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(migrate_layout(args.dry_run, args.rate)))
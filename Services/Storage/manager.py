@@ -1,45 +1,173 @@
-import os
-from pathlib import Path
+import re
+from datetime import datetime
+from hashlib import sha256
 from uuid import UUID, uuid4
 
 import aiofiles
 import filetype
-from fastapi import HTTPException
+from fastapi import HTTPException, Response, UploadFile
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-data_path = Path(os.path.join(os.getcwd(), "Services/Storage/data"))
-if not data_path.exists():
-    data_path.mkdir(parents=True)
+from Models.database import BlobDb, FileDb
+from Models.response import ExceptionResponseEnum
+from Services.Cache.lru import LRUCache
+from Services.Config.config import config
+from Services.Storage.backend import storage
 
+# keys of the stored files:
+# blobs/ab/cd/<hash>  content addressed files named by their SHA-256, shared
+#                     by every fid that uploaded the same bytes
+# files/ab/cd/<fid>   files stored by fid when content addressing is off
+# variants/ab/cd/<key>.<width>.<format>
+#                     resized and converted copies, width 0 keeps the size
+#                     of the original
+BLOBS, FILES, VARIANTS = "blobs", "files", "variants"
 
-async def save_file_async(file: bytes) -> UUID:
+# names the storage writes, <fid> or <hash> optionally followed by a suffix
+STORED_NAME = re.compile(r"(?:[0-9a-f]{32}|[0-9a-f]{64})(?:\..*)?")
+
+
+# bytes of recently served small files, keyed by file name
+image_cache = LRUCache[str, tuple[bytes, str]](
+    config.storage.cache_size, sizeof=lambda entry: entry[0].__len__()
+)
+
+
+def sharded(prefix: str, name: str) -> str:
+    # two levels of 256 directories keep each one small, ab/cd/abcd...
+    return f"{prefix}/{name[:2]}/{name[2:4]}/{name}"
+
+
+def storage_key(record: FileDb) -> str:
+    return record.hash if record.hash is not None else record.fid
+
+
+def stored_key(record: FileDb) -> str:
+    if record.hash is not None:
+        return sharded(BLOBS, record.hash)
+    return sharded(FILES, record.fid)
+
+
+def variant_key(key: str, width: int, fmt: str) -> str:
+    return sharded(VARIANTS, f"{key}.{width}.{fmt}")
+
+
+async def _save_upload(
+    db: AsyncSession, upload: UploadFile, limit: int
+) -> tuple[FileDb, int]:
     fid = uuid4()
+    digest = sha256()
+    mime, size = None, 0
+    async with storage.staging() as temp:
+        async with aiofiles.open(temp, "wb") as f:
+            while chunk := await upload.read(config.storage.chunk_size):
+                if mime is None:
+                    # image signatures sit in the first bytes of the file
+                    if filetype.guess_extension(chunk) not in ["jpg", "png"]:
+                        raise HTTPException(
+                            status_code=400, detail="Invalid image type"
+                        )
+                    mime = filetype.guess_mime(chunk)
+                size += chunk.__len__()
+                if size > limit:
+                    raise ExceptionResponseEnum.TOO_LARGE()
+                digest.update(chunk)
+                await f.write(chunk)
+        if mime is None:
+            raise HTTPException(status_code=400, detail="Invalid image type")
+
+        record = FileDb(fid=fid.hex, mime=mime, size=size, created=datetime.now())
+        if config.storage.content_addressed:
+            record.hash = digest.hexdigest()
+            # ON DUPLICATE KEY turns a repeated upload into one more reference,
+            # replacing the blob with identical bytes is harmless
+            await db.execute(
+                insert(BlobDb)
+                .values(hash=record.hash, size=size, refcount=1, created=record.created)
+                .on_duplicate_key_update(refcount=BlobDb.refcount + 1)
+            )
+        await storage.put_file(stored_key(record), temp)
+
+    db.add(record)
+    return record, size
 
-    if filetype.guess_extension(file) not in ["jpg", "png"]:
-        raise HTTPException(status_code=400, detail="Invalid image type")
 
-    async with aiofiles.open(data_path.joinpath(fid.hex), "wb") as f:
-        await f.write(file)
+async def save_files_async(db: AsyncSession, uploads: list[UploadFile]) -> list[UUID]:
+    # one upload at a time, a request never holds more than one chunk
+    # files already written when a later one fails are left to the collector
+    fids: list[UUID] = []
+    remaining = config.storage.request_size
+    for upload in uploads:
+        record, size = await _save_upload(
+            db, upload, min(config.storage.file_size, remaining)
+        )
+        fids.append(UUID(record.fid))
+        remaining -= size
+    return fids
 
-    return fid
 
+async def get_file(db: AsyncSession, fid: UUID) -> FileDb | None:
+    return await db.scalar(select(FileDb).where(FileDb.fid == fid.hex))
 
-async def load_file_async(fid: UUID) -> tuple[bytes, str] | None:
-    file_path = data_path.joinpath(fid.hex)
-    if not file_path.exists():
+
+async def load_file_async(key: str, mime: str) -> tuple[bytes, str] | None:
+    # stored files never change, the name is enough to key them
+    name = key.rsplit("/", 1)[-1]
+    if (entry := image_cache.get(name)) is not None:
+        return entry
+    if (data := await storage.read(key)) is None:
         return None
+    image_cache.set(name, (data, mime))
+    return data, mime
+
 
-    async with aiofiles.open(file_path, "rb") as f:
-        data = await f.read()
-        mime = filetype.guess_mime(data)
-        if isinstance(mime, str):
-            return data, mime
+async def send_file(
+    key: str, mime: str, headers: dict[str, str], byte_range: str | None = None
+) -> Response | None:
+    # small files are answered from memory, large ones and Range requests are
+    # streamed from storage in chunks
+    if not storage.redirects and byte_range is None:
+        if key.rsplit("/", 1)[-1] not in image_cache:
+            if (size := await storage.size(key)) is None:
+                return None
+            if size > config.storage.cache_file_size:
+                return await storage.response(key, mime, headers, None)
+        if (entry := await load_file_async(key, mime)) is not None:
+            return Response(
+                content=entry[0],
+                media_type=entry[1],
+                headers=headers | {"Accept-Ranges": "bytes"},
+            )
+    return await storage.response(key, mime, headers, byte_range)
 
-    return None
 
+async def file_response(
+    record: FileDb, headers: dict[str, str], byte_range: str | None = None
+) -> Response | None:
+    return await send_file(stored_key(record), record.mime, headers, byte_range)
 
-def remove_file(fid: UUID) -> bool:
-    file_path = data_path.joinpath(fid.hex)
-    if file_path.exists():
-        file_path.unlink()
+
+async def remove_file(db: AsyncSession, fid: UUID) -> bool:
+    # only the records go here, the files are deleted by the storage collector
+    # once the transaction is committed and nothing references them anymore
+    if (record := await get_file(db, fid)) is None:
+        return False
+    await db.delete(record)
+    # variants can no longer be requested either and age out of the cache
+    if record.hash is None:
+        image_cache.pop(record.fid)
         return True
-    return False
+
+    if (
+        blob := await db.scalar(
+            select(BlobDb).where(BlobDb.hash == record.hash).with_for_update()
+        )
+    ) is None:
+        return False
+    blob.refcount -= 1
+    if blob.refcount <= 0:
+        await db.delete(blob)
+        image_cache.pop(record.hash)
+    return True
@@ -0,0 +1,227 @@
+import asyncio
+import tempfile
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+
+import aiofiles
+from fastapi import Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+
+from Services.Config.config import S3Config
+from Services.Storage.backend import StorageBackend
+
+try:
+    import aiobotocore
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+    from botocore.exceptions import ClientError
+except ImportError:  # optional, only needed by the s3 backend
+    aiobotocore = None
+
+MISSING = ("404", "NoSuchKey", "NotFound")
+CHUNK_SIZE = 1024 * 64
+
+
+class S3Storage(StorageBackend):
+    """
+    S3 Storage
+    ~~~~~~~~~~
+    Files in a bucket of S3 or a compatible service. One client with a
+    connection pool is shared by every request of the worker, large files
+    are uploaded in parts. With ``presign`` image requests are redirected
+    to a presigned URL and the bytes never pass through the application.
+    """
+
+    def __init__(self, settings: S3Config) -> None:
+        self.settings = settings
+        self.redirects = settings.presign
+        self._client = None
+        self._stack: AsyncExitStack | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def staging_path(self) -> Path:
+        return Path(tempfile.gettempdir())
+
+    def _key(self, key: str) -> str:
+        return f"{self.settings.prefix}{key}"
+
+    async def client(self):
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    stack = AsyncExitStack()
+                    self._client = await stack.enter_async_context(
+                        get_session().create_client(
+                            "s3",
+                            endpoint_url=self.settings.endpoint,
+                            region_name=self.settings.region,
+                            aws_access_key_id=self.settings.access_key,
+                            aws_secret_access_key=self.settings.secret_key,
+                            config=AioConfig(
+                                max_pool_connections=self.settings.pool_size
+                            ),
+                        )
+                    )
+                    self._stack = stack
+        return self._client
+
+    async def _upload_parts(self, key: str, source: Path) -> None:
+        client = await self.client()
+        upload = await client.create_multipart_upload(
+            Bucket=self.settings.bucket, Key=key
+        )
+        parts = []
+        try:
+            async with aiofiles.open(source, "rb") as f:
+                while chunk := await f.read(self.settings.multipart_size):
+                    part = await client.upload_part(
+                        Bucket=self.settings.bucket,
+                        Key=key,
+                        UploadId=upload["UploadId"],
+                        PartNumber=parts.__len__() + 1,
+                        Body=chunk,
+                    )
+                    parts.append(
+                        {"ETag": part["ETag"], "PartNumber": parts.__len__() + 1}
+                    )
+            await client.complete_multipart_upload(
+                Bucket=self.settings.bucket,
+                Key=key,
+                UploadId=upload["UploadId"],
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            await client.abort_multipart_upload(
+                Bucket=self.settings.bucket, Key=key, UploadId=upload["UploadId"]
+            )
+            raise
+
+    async def put_file(self, key: str, source: Path) -> None:
+        # one part in memory at a time, smaller files go in a single request
+        if source.stat().st_size > self.settings.multipart_threshold:
+            await self._upload_parts(self._key(key), source)
+        else:
+            async with aiofiles.open(source, "rb") as f:
+                body = await f.read()
+            await (await self.client()).put_object(
+                Bucket=self.settings.bucket, Key=self._key(key), Body=body
+            )
+        source.unlink(missing_ok=True)
+
+    async def size(self, key: str) -> int | None:
+        try:
+            head = await (await self.client()).head_object(
+                Bucket=self.settings.bucket, Key=self._key(key)
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] in MISSING:
+                return None
+            raise
+        return head["ContentLength"]
+
+    async def exists(self, key: str) -> bool:
+        return await self.size(key) is not None
+
+    async def _get(self, key: str, **params) -> dict | None:
+        try:
+            return await (await self.client()).get_object(
+                Bucket=self.settings.bucket, Key=self._key(key), **params
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] in MISSING:
+                return None
+            raise
+
+    async def read(self, key: str) -> bytes | None:
+        if (result := await self._get(key)) is None:
+            return None
+        async with result["Body"] as body:
+            return await body.read()
+
+    @asynccontextmanager
+    async def local_copy(self, key: str) -> AsyncIterator[Path]:
+        if (result := await self._get(key)) is None:
+            raise FileNotFoundError(key)
+        async with self.staging() as path:
+            async with result["Body"] as body, aiofiles.open(path, "wb") as f:
+                async for chunk in body.iter_chunks(CHUNK_SIZE):
+                    await f.write(chunk)
+            yield path
+
+    async def response(
+        self, key: str, mime: str, headers: dict[str, str], byte_range: str | None
+    ) -> Response | None:
+        if self.redirects:
+            url = await (await self.client()).generate_presigned_url(
+                "get_object",
+                Params={
+                    "Bucket": self.settings.bucket,
+                    "Key": self._key(key),
+                    "ResponseContentType": mime,
+                },
+                ExpiresIn=self.settings.presign_expiry,
+            )
+            # the URL expires, clients may only reuse it for a while
+            return RedirectResponse(
+                url,
+                status_code=307,
+                headers={
+                    "Cache-Control": f"private, max-age={self.settings.presign_expiry // 2}",
+                    "Vary": headers.get("Vary", "Accept"),
+                },
+            )
+
+        try:
+            result = await self._get(
+                key, **({"Range": byte_range} if byte_range is not None else {})
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "InvalidRange":
+                return Response(status_code=416, headers=headers)
+            raise
+        if result is None:
+            return None
+
+        headers = headers | {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(result["ContentLength"]),
+        }
+        if "ContentRange" in result:
+            headers["Content-Range"] = result["ContentRange"]
+
+        async def stream() -> AsyncIterator[bytes]:
+            async with result["Body"] as body:
+                async for chunk in body.iter_chunks(CHUNK_SIZE):
+                    yield chunk
+
+        return StreamingResponse(
+            stream(),
+            status_code=206 if "ContentRange" in result else 200,
+            media_type=mime,
+            headers=headers,
+        )
+
+    async def delete(self, key: str) -> None:
+        await (await self.client()).delete_object(
+            Bucket=self.settings.bucket, Key=self._key(key)
+        )
+
+    async def scan(self) -> AsyncIterator[tuple[str, int, float]]:
+        paginator = (await self.client()).get_paginator("list_objects_v2")
+        async for page in paginator.paginate(
+            Bucket=self.settings.bucket, Prefix=self.settings.prefix
+        ):
+            for item in page.get("Contents", []):
+                yield (
+                    item["Key"].removeprefix(self.settings.prefix),
+                    item["Size"],
+                    item["LastModified"].timestamp(),
+                )
+
+    async def close(self) -> None:
+        if self._stack is not None:
+            await self._stack.aclose()
+            self._stack = None
+            self._client = None
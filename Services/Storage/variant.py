@@ -0,0 +1,120 @@
+import logging
+from pathlib import Path
+
+from fastapi import Response
+from PIL import Image, ImageOps
+
+from Models.database import FileDb
+from Services.Concurrency.concurrency import ProcessPool, SingleFlight
+from Services.Config.config import config
+from Services.Storage.backend import storage
+from Services.Storage.manager import (
+    send_file,
+    storage_key,
+    stored_key,
+    variant_key,
+)
+
+log = logging.getLogger("storage")
+
+FORMATS = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+# decoding and encoding images holds the GIL for a long time
+_pool = ProcessPool(config.storage.variant_workers, config.storage.variant_workers * 4)
+# one render per variant in this worker, other requests await it
+_renders = SingleFlight[str, None]()
+
+
+def _render(source: Path, target: Path, width: int, fmt: str, quality: int) -> None:
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if width and image.width > width:
+            image = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.Resampling.LANCZOS,
+            )
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(target, fmt.upper(), quality=quality)
+
+
+def _accepted(accept: str | None) -> set[str]:
+    types = set()
+    for item in (accept or "").split(","):
+        media, *params = [part.strip() for part in item.split(";")]
+        try:
+            if any(
+                float(param.split("=", 1)[1]) == 0
+                for param in params
+                if param.replace(" ", "").startswith("q=")
+            ):
+                continue
+        except ValueError:
+            continue
+        types.add(media.lower())
+    return types
+
+
+def choose_variant(
+    mime: str, accept: str | None, width: int | None
+) -> tuple[int, str] | None:
+    # the smallest bucket that fills the requested width, clients only get a
+    # few distinct sizes so the variants in storage stay few as well
+    buckets = sorted(config.storage.variant_widths)
+    bucket = (
+        0
+        if width is None or not buckets
+        else next((item for item in buckets if item >= width), buckets[-1])
+    )
+    accepted = _accepted(accept)
+    fmt = next(
+        (item for item in config.storage.variant_formats if FORMATS[item] in accepted),
+        next((item for item, value in FORMATS.items() if value == mime), None),
+    )
+    if fmt is None or (bucket == 0 and FORMATS[fmt] == mime):
+        return None
+    return bucket, fmt
+
+
+async def _render_variant(record: FileDb, target: str, width: int, fmt: str) -> None:
+    # several workers may render the same variant, each into its own file
+    async with (
+        storage.local_copy(stored_key(record)) as source,
+        storage.staging() as temp,
+    ):
+        await _pool.run(
+            _render, source, temp, width, fmt, config.storage.variant_quality
+        )
+        await storage.put_file(target, temp)
+
+
+async def _ensure(record: FileDb, width: int, fmt: str) -> str:
+    # keyed by content, aliases of one blob share their variants
+    target = variant_key(storage_key(record), width, fmt)
+    if not await storage.exists(target):
+        await _renders.run(target, lambda: _render_variant(record, target, width, fmt))
+    return target
+
+
+async def variant_response(
+    record: FileDb,
+    variant: tuple[int, str],
+    headers: dict[str, str],
+    byte_range: str | None = None,
+) -> Response | None:
+    width, fmt = variant
+    try:
+        key = await _ensure(record, width, fmt)
+    except Exception:
+        log.exception(f"Failed to render {fmt} variant of {record.fid}")
+        return None
+    return await send_file(key, FORMATS[fmt], headers, byte_range)
+
+
+def shutdown_renderer() -> None:
+    _pool.shutdown()
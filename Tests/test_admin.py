@@ -0,0 +1,67 @@
+import os
+import secrets
+
+from fastapi.testclient import TestClient
+
+from Models.metrics import CacheStats, PoolStatus, StorageGcStatus
+from Models.response import BaseResponse
+from Services.Storage.backend import data_path
+from Services.Storage.manager import BLOBS, sharded
+
+
+def test_database_status(authorized_client: TestClient):
+    response = authorized_client.get("/admin/database")
+
+    assert response.status_code == 200
+    data = BaseResponse[dict[str, PoolStatus]].model_validate(response.json()).data
+    assert data is not None and "primary" in data
+    assert data["primary"].checkouts > 0
+    assert data["primary"].checked_out + data["primary"].idle > 0
+
+
+def test_database_status_unauthorized(client: TestClient):
+    response = client.get("/admin/database", headers={"Authorization": ""})
+
+    assert response.status_code == 401
+
+
+def test_cache_status(authorized_client: TestClient):
+    authorized_client.get("/user/profile")
+    response = authorized_client.get("/admin/cache")
+
+    assert response.status_code == 200
+    data = BaseResponse[dict[str, CacheStats]].model_validate(response.json()).data
+    assert data is not None and "user.l1" in data and "user.l2" in data
+    assert data["user.l1"].size and data["user.l1"].hits > 0
+    assert data["image"].maxbytes is not None and data["image"].bytes is not None
+
+
+def test_storage_gc(authorized_client: TestClient):
+    # an old blob nothing refers to, and a file the storage never wrote
+    orphan = data_path.joinpath(sharded(BLOBS, secrets.token_hex(32)))
+    orphan.parent.mkdir(parents=True, exist_ok=True)
+    orphan.write_bytes(b"orphan")
+    os.utime(orphan, (0, 0))
+    foreign = data_path.joinpath("README")
+    foreign.write_bytes(b"keep")
+    os.utime(foreign, (0, 0))
+
+    try:
+        for dry_run in (True, False):
+            response = authorized_client.post(
+                "/admin/storage/gc", params={"dry_run": dry_run}
+            )
+            assert response.status_code == 202
+            for _ in range(100):
+                response = authorized_client.get("/admin/storage")
+                status = BaseResponse[StorageGcStatus].model_validate(response.json())
+                assert status.data is not None
+                if not status.data.running:
+                    break
+            assert status.data.dry_run == dry_run
+            assert status.data.removed >= 1 and status.data.freed >= 6
+            assert orphan.exists() == dry_run
+        assert foreign.exists()
+    finally:
+        orphan.unlink(missing_ok=True)
+        foreign.unlink()
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+from Services.Cache.cache import create_cache
+from Services.Cache.invalidation import InvalidationBus
+from Services.Cache.lru import LRUCache
+from Services.Cache.tiered import TieredCache
+from Services.Config.config import CacheConfig
+
+
+def redis_cache(server: FakeServer, **kwargs):
+    cache = create_cache(CacheConfig(backend="redis", **kwargs))
+    cache.client = FakeRedis(server=server)
+    return cache
+
+
+@pytest.mark.parametrize("serializer", ["json", "msgpack", "pickle"])
+def test_redis_cache(serializer: str):
+    async def run():
+        server = FakeServer()
+        cache = redis_cache(server, serializer=serializer)
+
+        assert await cache.set("captcha", {"code": "12345"}, ttl=300)
+        assert await cache.get("captcha") == {"code": "12345"}
+        assert await FakeRedis(server=server).exists("shop:captcha")
+
+        await cache.delete("captcha")
+        assert await cache.get("captcha") is None
+
+    asyncio.run(run())
+
+
+def test_redis_cache_shared():
+    async def run():
+        server = FakeServer()
+        worker_a = redis_cache(server)
+        worker_b = redis_cache(server)
+        other = redis_cache(server, namespace="staging:")
+
+        await worker_a.set("captcha", "12345", ttl=300)
+        assert await worker_b.get("captcha") == "12345"
+        assert await other.get("captcha") is None
+
+    asyncio.run(run())
+
+
+def test_tiered_cache_invalidation():
+    async def run():
+        server = FakeServer()
+        workers = []
+        for _ in range(2):
+            shared = redis_cache(server)
+            bus = InvalidationBus(shared, "shop:invalidate")
+            workers.append((TieredCache("item", shared, bus, 16, 60), bus))
+        (worker_a, bus_a), (worker_b, bus_b) = workers
+        listeners = [asyncio.create_task(bus.run()) for bus in (bus_a, bus_b)]
+        await asyncio.sleep(0.1)
+
+        await worker_a.set("1", {"price": 100})
+        assert await worker_b.get("1") == {"price": 100}
+        assert await worker_b.get("1") == {"price": 100}
+        stats = worker_b.stats()
+        assert stats["item.l1"].hits == 1 and stats["item.l2"].hits == 1
+
+        await worker_a.delete("1")
+        for _ in range(50):
+            if "1" not in worker_b.local:
+                break
+            await asyncio.sleep(0.01)
+        assert "1" not in worker_b.local
+        assert await worker_b.get("1") is None
+
+        for listener in listeners:
+            listener.cancel()
+
+    asyncio.run(run())
+
+
+def test_tiered_cache_stampede():
+    async def run():
+        server = FakeServer()
+        shared = redis_cache(server)
+        workers = [
+            TieredCache(
+                "item", shared, InvalidationBus(shared, "shop:invalidate"), 16, 60
+            )
+            for _ in range(2)
+        ]
+        calls = 0
+
+        async def fill():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.2)
+            return {"price": 100}
+
+        values = await asyncio.gather(
+            *(worker.get_or_set("1", fill) for worker in workers for _ in range(50))
+        )
+        assert values == [{"price": 100}] * 100
+        assert calls == 1
+
+    asyncio.run(run())
+
+
+def test_tiered_cache_version():
+    async def run():
+        shared = redis_cache(FakeServer())
+        cache = TieredCache(
+            "item", shared, InvalidationBus(shared, "shop:invalidate"), 16, 60
+        )
+
+        # the fill read the old price, the edit is committed and invalidated
+        # before the fill publishes it
+        async def fill():
+            await cache.delete("1")
+            return {"price": 100}
+
+        assert await cache.get_or_set("1", fill) == {"price": 100}
+        assert await cache.get("1") is None
+
+        version = await cache.version("1")
+        assert await cache.set("1", {"price": 200}, version)
+        assert await cache.get("1") == {"price": 200}
+        await cache.delete("1")
+        assert not await cache.set("1", {"price": 100}, version)
+        assert await cache.get("1") is None
+
+    asyncio.run(run())
+
+
+def test_lru_cache_bytes():
+    cache = LRUCache[str, bytes](10, sizeof=len)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    assert cache.get("a") == b"1234"
+
+    # b is the least recently used and makes room for c
+    cache.set("c", b"12345")
+    assert "b" not in cache and "a" in cache and "c" in cache
+    cache.set("d", b"12345678901")
+    assert "d" not in cache
+
+    stats = cache.stats()
+    assert stats.bytes == 9 and stats.maxbytes == 10
+    assert stats.evictions == 1 and stats.evicted_bytes == 4
+    assert cache.pop("a") == b"1234" and cache.stats().bytes == 5
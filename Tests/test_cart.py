@@ -1,3 +1,5 @@
+from uuid import uuid4
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -129,3 +131,14 @@ def test_clear_cart(
     assert get_response.status_code == 200
     data = BaseResponse[list[CartCommodity]].model_validate(get_response.json()).data
     assert data is not None and len(data) == 0
+
+
+@pytest.mark.order(after="test_clear_cart")
+def test_cart_not_found(authorized_client: TestClient, cart_commodity_a: str):
+    add_response = authorized_client.post(f"/cart/add/{uuid4()}")
+
+    assert add_response.status_code == 404
+
+    del_response = authorized_client.delete(f"/cart/remove/{cart_commodity_a}")
+
+    assert del_response.status_code == 404
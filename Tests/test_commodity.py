@@ -1,10 +1,17 @@
 import hashlib
+import io
+import os
 
 import pytest
 from fastapi.testclient import TestClient
+from PIL import Image
 
 from Models.commodity import BaseCommodity, Comment, Commodity, CreateCommodity
-from Models.response import BaseResponse
+from Models.metrics import StorageGcStatus
+from Models.response import BaseResponse, PagedResponse
+from Services.Config.config import config
+from Services.Storage.backend import data_path
+from Services.Storage.manager import BLOBS, image_cache, sharded
 
 
 @pytest.fixture(scope="session")
@@ -31,6 +38,70 @@ def create_commodity(authorized_client: TestClient):
     return cid
 
 
+def test_commodity_upload_rejected(authorized_client: TestClient):
+    body = CreateCommodity(name="Rejected", price=1, description="Test")
+
+    response = authorized_client.post(
+        "/shop/add",
+        data={"body": body.model_dump_json()},
+        files=[("images", ("text.png", b"not an image" * 100, "image/png"))],
+    )
+    assert response.status_code == 400
+
+    # an image no other test uploads, saved before the rejected one
+    image = io.BytesIO()
+    Image.frombytes("RGB", (16, 16), os.urandom(16 * 16 * 3)).save(image, "PNG")
+    digest = hashlib.sha256(image.getvalue()).hexdigest()
+    png = b"\x89PNG\r\n\x1a\n" + bytes(config.storage.file_size)
+    response = authorized_client.post(
+        "/shop/add",
+        data={"body": body.model_dump_json()},
+        files=[
+            ("images", ("saved.png", image.getvalue(), "image/png")),
+            ("images", ("large.png", png, "image/png")),
+        ],
+    )
+    assert response.status_code == 413
+    assert not list(data_path.glob("*.part"))
+    listing = authorized_client.get("/shop/all", params={"limit": 100}).json()
+    assert all(item["name"] != "Rejected" for item in listing["data"])
+
+    # the saved file stays on disk without a record, the collector removes it
+    orphan = data_path.joinpath(sharded(BLOBS, digest))
+    assert orphan.exists()
+    os.utime(orphan, (0, 0))
+    response = authorized_client.post("/admin/storage/gc", params={"dry_run": False})
+    assert response.status_code == 202
+    for _ in range(100):
+        response = authorized_client.get("/admin/storage")
+        status = BaseResponse[StorageGcStatus].model_validate(response.json()).data
+        assert status is not None
+        if not status.running:
+            break
+    assert not orphan.exists()
+
+
+def test_commodity_upload_limit(authorized_client: TestClient, create_commodity: str):
+    def chunked(size: int):
+        for _ in range(0, size, 1024 * 1024):
+            yield bytes(1024 * 1024)
+
+    # without a Content-Length the body is counted while it arrives
+    response = authorized_client.put(
+        f"/shop/item/{create_commodity}",
+        content=chunked(config.storage.request_size + 1024 * 1024 * 2),
+        headers={"Content-Type": "multipart/form-data; boundary=limit"},
+    )
+    assert response.status_code == 413
+    assert BaseResponse[None].model_validate(response.json()).status_code == 413
+
+    # routes without images keep the default limit
+    response = authorized_client.post(
+        f"/shop/item/{create_commodity}/comment", content=bytes(1024 * 1024 * 2)
+    )
+    assert response.status_code == 413
+
+
 def test_commodity_all(client: TestClient, create_commodity: str):
     response = client.get("/shop/all")
 
@@ -97,6 +168,125 @@ def test_comment(authorized_client: TestClient, create_commodity: str):
     BaseResponse[None].model_validate(response.json())
 
 
+@pytest.mark.order(after="test_get_commodity", before="test_commodity_edit")
+def test_commodity_conditional(client: TestClient, create_commodity: str):
+    response = client.get(f"/shop/item/{create_commodity}")
+    assert response.status_code == 200
+    assert (etag := response.headers.get("etag")) is not None
+
+    response = client.get(
+        f"/shop/item/{create_commodity}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b"" and response.headers["etag"] == etag
+
+    response = client.get("/shop/all")
+    assert response.status_code == 200
+    response = client.get(
+        "/shop/all", headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert response.status_code == 304
+
+    data = (
+        BaseResponse[Commodity]
+        .model_validate(client.get(f"/shop/item/{create_commodity}").json())
+        .data
+    )
+    assert data is not None
+    response = client.get(f"/shop/image/{data.images[0]}")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    assert (modified := response.headers.get("last-modified")) is not None
+
+    response = client.get(
+        f"/shop/image/{data.images[0]}", headers={"If-Modified-Since": modified}
+    )
+    assert response.status_code == 304
+    response = client.get(
+        f"/shop/image/{data.images[0]}", headers={"If-None-Match": '"stale"'}
+    )
+    assert response.status_code == 200
+    hits = image_cache.hits
+    response = client.get(f"/shop/image/{data.images[0]}")
+    assert response.status_code == 200 and image_cache.hits == hits + 1
+
+    with open("Tests/Resources/commodity.jpg", "rb") as f:
+        head = f.read(16)
+    response = client.get(
+        f"/shop/image/{data.images[0]}", headers={"Range": "bytes=0-15"}
+    )
+    assert response.status_code == 206
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content == head
+
+
+@pytest.mark.order(after="test_get_commodity", before="test_commodity_edit")
+def test_commodity_variant(client: TestClient, create_commodity: str):
+    response = client.get(
+        f"/shop/item/{create_commodity}/album",
+        params={"w": 150},
+        headers={"Accept": "image/avif;q=0, image/webp, */*"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+    with Image.open(io.BytesIO(response.content)) as image:
+        assert image.format == "WEBP" and image.width == 200
+
+    response = client.get(
+        f"/shop/item/{create_commodity}/album",
+        params={"w": 150},
+        headers={"Accept": "image/webp", "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+
+    response = client.get(f"/shop/item/{create_commodity}/album", params={"w": 100000})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+
+    response = client.get(f"/shop/item/{create_commodity}/album", params={"w": 0})
+    assert response.status_code == 400
+
+
+@pytest.mark.order(before="test_commodity_edit")
+def test_commodity_dedupe(authorized_client: TestClient, create_commodity: str):
+    with open("Tests/Resources/commodity.jpg", "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    response = authorized_client.post(
+        "/shop/add",
+        data={
+            "body": CreateCommodity(
+                name="Duplicate", price=1, description="Test"
+            ).model_dump_json()
+        },
+        files=[("images", ("a.jpg", data, "image/jpeg"))] * 2,
+    )
+    assert response.status_code == 201
+    cid = BaseResponse[str].model_validate(response.json()).data
+
+    item = (
+        BaseResponse[Commodity]
+        .model_validate(authorized_client.get(f"/shop/item/{cid}").json())
+        .data
+    )
+    assert item is not None and len(set(item.images)) == 2
+    for fid in item.images:
+        response = authorized_client.get(f"/shop/image/{fid}")
+        assert response.headers["etag"] == f'"{digest}"'
+    assert data_path.joinpath(sharded(BLOBS, digest)).exists()
+
+    # the fixture commodity still references the same bytes
+    response = authorized_client.delete(f"/shop/item/{cid}")
+    assert response.status_code == 200
+    response = authorized_client.get(f"/shop/item/{create_commodity}/album")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{digest}"'
+    response = authorized_client.get(f"/shop/image/{item.images[0]}")
+    assert response.status_code == 404
+
+
 @pytest.mark.order(after="test_get_commodity")
 def test_commodity_edit(authorized_client: TestClient, create_commodity: str):
     with open("Tests/Resources/commodity_2.png", "rb") as f:
@@ -118,6 +308,11 @@ def test_commodity_edit(authorized_client: TestClient, create_commodity: str):
     assert data.price == 200
     assert len(data.images) == 1
 
+    response = authorized_client.get("/shop/all", params={"limit": 100})
+    listing = PagedResponse[BaseCommodity].model_validate(response.json()).data
+    assert listing is not None
+    assert [item.price for item in listing if item.cid == create_commodity] == [200]
+
     album_response = authorized_client.get(f"/shop/image/{data.album}")
     assert album_response.status_code == 200
     assert hashlib.sha256(album_response.content).hexdigest() == sha
@@ -135,3 +330,64 @@ def test_commodity_delete(authorized_client: TestClient, create_commodity: str):
     response = authorized_client.get(f"/shop/item/{create_commodity}")
     assert response.status_code == 404
     BaseResponse[None].model_validate(response.json())
+
+
+@pytest.mark.order(before="test_commodity_delete")
+def test_commodity_cursor(client: TestClient, create_commodity: str):
+    response = client.get("/shop/all", params={"limit": 100})
+
+    assert response.status_code == 200
+    full = PagedResponse[BaseCommodity].model_validate(response.json()).data
+    assert full is not None
+
+    cids, cursor = [], None
+    while True:
+        response = client.get(
+            "/shop/all",
+            params={"limit": 1} if cursor is None else {"limit": 1, "cursor": cursor},
+        )
+        assert response.status_code == 200
+        page = PagedResponse[BaseCommodity].model_validate(response.json())
+        assert page.data is not None
+        cids.extend(item.cid for item in page.data)
+        if (cursor := page.next) is None:
+            break
+
+    assert cids == [item.cid for item in full]
+    assert create_commodity in cids
+
+    response = client.get("/shop/all", params={"limit": 100, "order": "desc"})
+    data = PagedResponse[BaseCommodity].model_validate(response.json()).data
+    assert data is not None and [item.cid for item in data] == cids[::-1]
+
+    response = client.get("/shop/all", params={"cursor": "invalid"})
+    assert response.status_code == 400
+
+
+@pytest.mark.order(after="test_comment", before="test_commodity_delete")
+def test_comment_cursor(authorized_client: TestClient, create_commodity: str):
+    for index in range(3):
+        response = authorized_client.post(
+            f"/shop/item/{create_commodity}/comment",
+            json={"content": f"Page {index}"},
+        )
+        assert response.status_code == 201
+
+    response = authorized_client.get(
+        f"/shop/item/{create_commodity}/comment", params={"limit": 2}
+    )
+    assert response.status_code == 200
+    first = PagedResponse[Comment].model_validate(response.json())
+    assert first.data is not None and len(first.data) == 2
+    assert first.total is not None and first.total >= 3
+    assert first.next is not None
+
+    response = authorized_client.get(
+        f"/shop/item/{create_commodity}/comment",
+        params={"limit": 2, "cursor": first.next},
+    )
+    assert response.status_code == 200
+    second = PagedResponse[Comment].model_validate(response.json())
+    assert second.data is not None and len(second.data) > 0
+    assert second.total is None
+    assert not {item.cid for item in first.data} & {item.cid for item in second.data}
@@ -0,0 +1,56 @@
+import asyncio
+import operator
+
+import pytest
+
+from Services.Concurrency.concurrency import ProcessPool, SingleFlight
+
+
+def test_single_flight():
+    async def run():
+        flights = SingleFlight[str, int]()
+        calls = 0
+
+        async def work() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return calls
+
+        # the first caller gives up, the others still get the result
+        first = asyncio.create_task(flights.run("a", work))
+        await asyncio.sleep(0)
+        others = [asyncio.create_task(flights.run("a", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await asyncio.gather(*others) == [1, 1, 1]
+        assert first.cancelled() and calls == 1
+
+        # finished calls are not reused
+        assert await flights.run("a", work) == 2
+
+        async def fail() -> int:
+            await asyncio.sleep(0.1)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(
+            *(flights.run("b", fail) for _ in range(2)), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(run())
+
+
+def test_process_pool():
+    async def run():
+        pool = ProcessPool(workers=1, limit=2)
+        try:
+            assert await asyncio.gather(
+                *(pool.run(operator.mul, value, 2) for value in range(4))
+            ) == [0, 2, 4, 6]
+            with pytest.raises(ZeroDivisionError):
+                await pool.run(operator.truediv, 1, 0)
+        finally:
+            pool.shutdown()
+
+    asyncio.run(run())
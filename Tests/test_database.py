@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.requests import Request
+
+from Services.Database import database
+from Services.Database.database import get_db, get_read_db
+from Services.Database.replica import PRIMARY_COOKIE, PrimaryStickiness, ReplicaSet
+
+
+def request(cookie: str = "") -> Request:
+    return Request(
+        {"type": "http", "headers": [(b"cookie", cookie.encode())] if cookie else []}
+    )
+
+
+def test_replica_round_robin():
+    engines = [create_async_engine("sqlite+aiosqlite://") for _ in range(3)]
+    replicas = ReplicaSet(engines, retry=30)
+
+    assert [replicas.pick() for _ in range(4)] == [
+        (0, engines[0]),
+        (1, engines[1]),
+        (2, engines[2]),
+        (0, engines[0]),
+    ]
+
+    # a failed replica is skipped until the retry interval has passed
+    replicas.failed(1, OSError("unreachable"))
+    assert [replicas.pick() for _ in range(3)] == [
+        (2, engines[2]),
+        (0, engines[0]),
+        (2, engines[2]),
+    ]
+    assert not replicas.is_available(1)
+    replicas.retry = 0
+    replicas.failed(1, OSError("unreachable"))
+    assert replicas.is_available(1)
+
+    # with every replica down reads go to the primary
+    replicas.retry = 30
+    for index in range(3):
+        replicas.failed(index, OSError("unreachable"))
+    assert replicas.pick() is None
+    assert ReplicaSet([], retry=30).pick() is None
+
+
+def test_read_db(monkeypatch: pytest.MonkeyPatch):
+    async def run():
+        healthy = create_async_engine("sqlite+aiosqlite://")
+        broken = create_async_engine("sqlite+aiosqlite:////nonexistent/replica.db")
+        replicas = ReplicaSet([healthy, broken], retry=30)
+        monkeypatch.setattr(database, "replicas", replicas)
+
+        # sessions are bound lazily, nothing is checked out until a query runs
+        reads = get_read_db(request())
+        session = await anext(reads)
+        assert session.bind is healthy and not session.in_transaction()
+        assert await session.scalar(text("SELECT 1")) == 1
+        await reads.aclose()
+
+        reads = get_read_db(request())
+        session = await anext(reads)
+        assert session.bind is broken
+        with pytest.raises(OperationalError) as error:
+            await session.scalar(text("SELECT 1"))
+        with pytest.raises(OperationalError):
+            await reads.athrow(error.value)
+        assert not replicas.is_available(1)
+
+        # the broken replica is skipped, and clients which just wrote read
+        # from the primary
+        for _ in range(2):
+            reads = get_read_db(request())
+            assert (await anext(reads)).bind is healthy
+            await reads.aclose()
+        reads = get_read_db(request(f"{PRIMARY_COOKIE}=1"))
+        assert (await anext(reads)).bind is database.engine
+        await reads.aclose()
+
+        await healthy.dispose()
+        await broken.dispose()
+
+    asyncio.run(run())
+
+
+def test_primary_stickiness():
+    app = FastAPI()
+    app.add_middleware(PrimaryStickiness, max_age=5)
+
+    @app.post("/write")
+    async def write(db: AsyncSession = Depends(get_db)) -> None:
+        await db.commit()
+
+    @app.get("/read")
+    async def read(db: AsyncSession = Depends(get_read_db)) -> None:
+        pass
+
+    with TestClient(app) as client:
+        response = client.get("/read")
+        assert PRIMARY_COOKIE not in response.cookies
+
+        response = client.post("/write")
+        assert response.cookies[PRIMARY_COOKIE] == "1"
+        assert "Max-Age=5" in response.headers["set-cookie"]
@@ -1,9 +1,11 @@
+from uuid import uuid4
+
 import pytest
 from fastapi.testclient import TestClient
 
 from Models.commodity import CreateCommodity
 from Models.order import Order, OrderBase, OrderStatus
-from Models.response import BaseResponse
+from Models.response import BaseResponse, PagedResponse
 from Models.user import AddressBase
 
 
@@ -74,6 +76,28 @@ def test_all_order(authorized_client: TestClient):
     assert response.status_code == 200
     data = BaseResponse[list[Order]].model_validate(response.json()).data
     assert data is not None and len(data) == 2
+    assert all(item.price == {cid: 100 for cid in item.content} for item in data)
+
+
+@pytest.mark.order(before="test_all_order")
+def test_add_order_invalid(
+    authorized_client: TestClient, address: str, order_commodity: str
+):
+    response = authorized_client.post(
+        "/order/add",
+        json=OrderBase(
+            aid=address, content={order_commodity: 1, uuid4().hex: 1}
+        ).model_dump(),
+    )
+
+    assert response.status_code == 404
+
+    response = authorized_client.post(
+        "/order/add",
+        json=OrderBase(aid=uuid4().hex, content={order_commodity: 1}).model_dump(),
+    )
+
+    assert response.status_code == 404
 
 
 @pytest.mark.order(after="test_all_order")
@@ -108,3 +132,28 @@ def test_order_status(authorized_client: TestClient, order_commodity_b: str):
 
     order = [item for item in data if item.oid == order_commodity_b]
     assert len(order) == 1 and order[0].status == OrderStatus.Shipped.value
+
+
+def test_order_cursor(authorized_client: TestClient):
+    response = authorized_client.get("/order/list")
+    full = PagedResponse[Order].model_validate(response.json()).data
+    assert full is not None
+
+    oids, cursor = [], None
+    while True:
+        response = authorized_client.get(
+            "/order/list",
+            params={"limit": 1} if cursor is None else {"limit": 1, "cursor": cursor},
+        )
+        assert response.status_code == 200
+        page = PagedResponse[Order].model_validate(response.json())
+        assert page.data is not None
+        oids.extend(item.oid for item in page.data)
+        if (cursor := page.next) is None:
+            break
+
+    assert oids == [item.oid for item in full]
+
+    response = authorized_client.get("/order/list", params={"page": 2, "limit": 1})
+    data = PagedResponse[Order].model_validate(response.json()).data
+    assert data is not None and len(data) == 1 and data[0].oid == oids[1]
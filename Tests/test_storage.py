@@ -0,0 +1,109 @@
+import asyncio
+import os
+import secrets
+import socket
+
+import pytest
+from moto.server import ThreadedMotoServer
+
+from Services.Config.config import S3Config
+from Services.Storage.s3 import S3Storage
+
+PART_SIZE = 1024 * 1024 * 5
+
+
+@pytest.fixture(scope="module")
+def endpoint():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+def s3_storage(endpoint: str, **kwargs) -> S3Storage:
+    return S3Storage(
+        S3Config(
+            bucket="shop",
+            prefix="test/",
+            endpoint=endpoint,
+            region="us-east-1",
+            access_key="testing",
+            secret_key="testing",
+            multipart_threshold=PART_SIZE,
+            multipart_size=PART_SIZE,
+            **kwargs,
+        )
+    )
+
+
+async def put(storage: S3Storage, key: str, data: bytes) -> None:
+    async with storage.staging() as temp:
+        temp.write_bytes(data)
+        await storage.put_file(key, temp)
+
+
+async def body(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_s3_storage(endpoint: str):
+    async def run():
+        storage = s3_storage(endpoint)
+        await (await storage.client()).create_bucket(Bucket="shop")
+        small, large = os.urandom(1024), os.urandom(PART_SIZE * 2 + 1024)
+        small_key = f"blobs/aa/bb/{secrets.token_hex(32)}"
+        large_key = f"files/cc/dd/{secrets.token_hex(16)}"
+        try:
+            await put(storage, small_key, small)
+            # three parts, the last one smaller than the others
+            await put(storage, large_key, large)
+
+            assert await storage.read(small_key) == small
+            assert await storage.read(large_key) == large
+            assert await storage.size(large_key) == large.__len__()
+            assert not await storage.exists("blobs/00/00/missing")
+            assert await storage.read("blobs/00/00/missing") is None
+
+            response = await storage.response(large_key, "image/png", {}, None)
+            assert response is not None and response.status_code == 200
+            assert await body(response) == large
+            response = await storage.response(
+                large_key, "image/png", {}, "bytes=100-199"
+            )
+            assert response is not None and response.status_code == 206
+            assert response.headers["content-range"].startswith("bytes 100-199/")
+            assert await body(response) == large[100:200]
+
+            async with storage.local_copy(small_key) as path:
+                assert path.read_bytes() == small
+            assert not path.exists()
+
+            keys = {key: size async for key, size, _ in storage.scan()}
+            assert keys == {small_key: small.__len__(), large_key: large.__len__()}
+
+            await storage.delete(small_key)
+            assert not await storage.exists(small_key)
+        finally:
+            await storage.close()
+
+    asyncio.run(run())
+
+
+def test_s3_storage_presign(endpoint: str):
+    async def run():
+        storage = s3_storage(endpoint, presign=True, presign_expiry=600)
+        try:
+            response = await storage.response(
+                "blobs/aa/bb/image", "image/png", {"Vary": "Accept"}, None
+            )
+            assert response is not None and response.status_code == 307
+            assert "blobs/aa/bb/image" in response.headers["location"]
+            assert "Signature" in response.headers["location"]
+            assert response.headers["cache-control"] == "private, max-age=300"
+        finally:
+            await storage.close()
+
+    asyncio.run(run())
@@ -1,14 +1,30 @@
 from datetime import datetime
+import asyncio
 import secrets
+from datetime import timedelta
 from time import sleep
 
 from fastapi.encoders import jsonable_encoder
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import select
 
+from Models.database import UserDb
 from Models.response import BaseResponse
-from Models.user import Gender, Permission, Token, User
+from Models.user import Gender, Permission, Token, TokenData, User, UserSession
 from Services.Config.config import InvalidConfigError, config
+from Services.Database.database import SessionLocal
+from Services.Security.revocation import RevocationList
+from Services.Security.user import (
+    create_access_token,
+    create_user_token,
+    decode_token,
+    invalidate_user,
+    load_user,
+    revocations,
+    revoke_tokens,
+    user_cache,
+)
 from Tests.Utils.user import get_captcha
 
 
@@ -121,3 +137,260 @@ def test_user_update(authorized_client: TestClient, register_user: tuple[str, st
         and data.birthday == date
         and data.gender == Gender.FEMALE
     )
+
+
+@pytest.mark.order(before="test_user_recover")
+def test_user_logout(authorized_client: TestClient, register_user: tuple[str, str]):
+    logout_response = authorized_client.post("/user/logout")
+
+    assert logout_response.status_code == 200
+    BaseResponse[None].model_validate(logout_response.json())
+
+    profile_response = authorized_client.get("/user/profile")
+    assert profile_response.status_code == 401
+    cart_response = authorized_client.get("/cart/all")
+    assert cart_response.status_code == 401
+
+    login_response = authorized_client.post(
+        "/user/login",
+        data={"username": register_user[0], "password": register_user[1]},
+    )
+
+    assert login_response.status_code == 200
+    token = BaseResponse[Token].model_validate(login_response.json()).data
+    assert token is not None
+    authorized_client.headers.update({"Authorization": f"Bearer {token.access_token}"})
+
+
+@pytest.mark.order(before="test_user_recover")
+def test_user_rehash(
+    client: TestClient, register_user: tuple[str, str], monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(config.security, "bcrypt_rounds", 4)
+
+    async def stored_hash() -> str | None:
+        async with SessionLocal() as db:
+            return await db.scalar(
+                select(UserDb.password).where(UserDb.username == register_user[0])
+            )
+
+    hashes = []
+    for _ in range(2):
+        login_response = client.post(
+            "/user/login",
+            data={"username": register_user[0], "password": register_user[1]},
+        )
+
+        assert login_response.status_code == 200
+        BaseResponse[Token].model_validate(login_response.json())
+        assert client.portal is not None
+        hashes.append(client.portal.call(stored_hash))
+
+    # rehashed at the new cost on the first login, left alone on the second
+    assert hashes[0] is not None and hashes[0].startswith("$2b$04$")
+    assert hashes[1] == hashes[0]
+
+
+@pytest.mark.order(before="test_user_recover")
+def test_user_refresh(client: TestClient, register_user: tuple[str, str]):
+    def login() -> Token:
+        login_response = client.post(
+            "/user/login",
+            data={"username": register_user[0], "password": register_user[1]},
+        )
+        assert login_response.status_code == 200
+        token = BaseResponse[Token].model_validate(login_response.json()).data
+        assert token is not None and token.refresh_token is not None
+        return token
+
+    def refresh(refresh_token: str | None):
+        return client.post("/user/refresh", data={"refresh_token": refresh_token})
+
+    token = login()
+    refresh_response = refresh(token.refresh_token)
+
+    assert refresh_response.status_code == 200
+    rotated = BaseResponse[Token].model_validate(refresh_response.json()).data
+    assert rotated is not None and rotated.refresh_token != token.refresh_token
+    headers = {"Authorization": f"Bearer {rotated.access_token}"}
+    assert client.get("/user/profile", headers=headers).status_code == 200
+
+    # replaying a rotated token ends the session
+    assert refresh(token.refresh_token).status_code == 401
+    assert refresh(rotated.refresh_token).status_code == 401
+
+    token = login()
+    headers = {"Authorization": f"Bearer {token.access_token}"}
+    session_response = client.get("/user/session", headers=headers)
+
+    assert session_response.status_code == 200
+    sessions = BaseResponse[list[UserSession]].model_validate(session_response.json())
+    assert sessions.data is not None and len(sessions.data) > 0
+
+    for session in sessions.data:
+        revoke_response = client.delete(f"/user/session/{session.sid}", headers=headers)
+        assert revoke_response.status_code == 200
+    assert refresh(token.refresh_token).status_code == 401
+
+
+def test_user_invalidate(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    # without stateless tokens nothing refreshes the revocation list
+    monkeypatch.setattr(config.security, "stateless", False)
+    uid = secrets.token_hex(16)
+
+    assert client.portal is not None
+    client.portal.call(invalidate_user, uid, 1)
+    assert not revocations.is_revoked(uid, 0)
+
+
+def test_user_cache_version(client: TestClient, register_user: tuple[str, str]):
+    async def run(racing: bool) -> str:
+        async with SessionLocal() as db:
+            uid = await db.scalar(
+                select(UserDb.uid).where(UserDb.username == register_user[0])
+            )
+            assert uid is not None
+            await invalidate_user(uid)
+
+            scalar = db.scalar
+
+            async def racing_scalar(*args, **kwargs):
+                row = await scalar(*args, **kwargs)
+                # an edit commits and invalidates after the row was read
+                await invalidate_user(uid)
+                return row
+
+            if racing:
+                db.scalar = racing_scalar
+            user = await load_user(TokenData(sub=uid, id=uid), db)
+            assert user.uid == uid
+            return uid
+
+    assert client.portal is not None
+    uid = client.portal.call(run, False)
+    assert client.portal.call(user_cache.get, uid) is not None
+
+    # the row read before the invalidation is not cached again
+    uid = client.portal.call(run, True)
+    assert client.portal.call(user_cache.get, uid) is None
+
+
+@pytest.mark.order(before="test_user_recover")
+def test_user_stateless(
+    authorized_client: TestClient,
+    register_user: tuple[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(config.security, "stateless", True)
+    loads: list[str] = []
+
+    async def counted_load_user(data: TokenData, db) -> User:
+        loads.append(data.id)
+        return await load_user(data, db)
+
+    monkeypatch.setattr("Services.Security.user.load_user", counted_load_user)
+
+    login_response = authorized_client.post(
+        "/user/login",
+        data={"username": register_user[0], "password": register_user[1]},
+    )
+    assert login_response.status_code == 200
+    data = BaseResponse[Token].model_validate(login_response.json()).data
+    assert data is not None
+    token = data.access_token
+
+    async def current_user() -> UserDb:
+        async with SessionLocal() as db:
+            record = await db.scalar(
+                select(UserDb).where(UserDb.username == register_user[0])
+            )
+            assert record is not None
+            return record
+
+    # the same token a login issues to the user as it is now
+    def issue() -> str:
+        assert authorized_client.portal is not None
+        return create_user_token(authorized_client.portal.call(current_user))
+
+    def cart(token: str) -> int:
+        headers = {"Authorization": f"Bearer {token}"}
+        return authorized_client.get("/cart/all", headers=headers).status_code
+
+    # the identity comes from the claims, the user is not loaded
+    assert cart(token) == 200 and loads == []
+
+    # tokens without the claims are checked against the user
+    uid = decode_token(token).id
+    legacy = create_access_token(TokenData(sub=uid, id=uid))
+    assert cart(legacy) == 200 and loads == [uid]
+
+    # tokens issued before a logout are revoked
+    headers = {"Authorization": f"Bearer {token}"}
+    assert authorized_client.post("/user/logout", headers=headers).status_code == 200
+    loads.clear()
+    assert cart(token) == 401 and loads == []
+    token = issue()
+    assert cart(token) == 200
+
+    # and so are tokens issued before a permission downgrade
+    edit_response = authorized_client.put(
+        f"/user/profile/{uid}",
+        json={"permission": Permission.USER.value},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert edit_response.status_code == 200
+    loads.clear()
+    assert cart(token) == 401 and loads == []
+    token = issue()
+    assert cart(token) == 200 and decode_token(token).permission == Permission.USER
+
+    async def restore_admin() -> None:
+        async with SessionLocal() as db:
+            record = await db.scalar(select(UserDb).where(UserDb.uid == uid))
+            assert record is not None
+            record.permission = Permission.ADMIN()
+            revoke_tokens(record)
+            await db.commit()
+            await invalidate_user(uid, record.token_version)
+
+    assert authorized_client.portal is not None
+    authorized_client.portal.call(restore_admin)
+    assert cart(token) == 401
+    authorized_client.headers.update({"Authorization": f"Bearer {issue()}"})
+
+
+@pytest.mark.order(after="test_user_logout")
+def test_user_revocation_list(client: TestClient, register_user: tuple[str, str]):
+    async def revoked_user() -> tuple[str, int]:
+        async with SessionLocal() as db:
+            record = await db.scalar(
+                select(UserDb).where(UserDb.username == register_user[0])
+            )
+            assert record is not None
+            record.token_revoked_at = datetime.now()
+            await db.commit()
+            return record.uid, record.token_version
+
+    async def run():
+        uid, version = await revoked_user()
+        assert version > 0
+
+        recent = RevocationList(timedelta(minutes=30), 10)
+        pending = secrets.token_hex(16)
+        refresh = asyncio.ensure_future(recent.refresh())
+        await asyncio.sleep(0)
+        # revoked after the query started, it is kept
+        recent.revoke(pending, 2)
+        await refresh
+        assert recent.is_revoked(uid, version - 1)
+        assert not recent.is_revoked(uid, version)
+        assert recent.is_revoked(pending, 1)
+
+        # revocations older than the window are dropped
+        expired = RevocationList(timedelta(0), 10)
+        expired.revoke(uid, version)
+        await expired.refresh()
+        assert not expired.is_revoked(uid, version - 1) and expired.__len__() == 0
+
+    assert client.portal is not None
+    client.portal.call(run)
@@ -1,20 +1,55 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
 
 from Models.response import http_exception_handler, validation_exception_handler
+from Routers.admin import admin_router
 from Routers.cart import cart_router
 from Routers.order import order_router
 from Routers.shop import shop_router
 from Routers.user import user_router
+from Services.Cache.cache import cache, invalidation
+from Services.Config.config import config
+from Services.Database.database import dispose_engines
+from Services.Database.migration import init_db
+from Services.Database.replica import PrimaryStickiness
 from Services.Limiter.size_limiter import LimitUploadSize
 from Services.Limiter.slow_limiter import RateLimitExceeded_handler, freq_limiter
 from Services.Log.logger import logging
+from Services.Security.password import shutdown_executor
+from Services.Security.user import revocations
+from Services.Storage.backend import storage
+from Services.Storage.collector import collector
+from Services.Storage.variant import shutdown_renderer
 
 log = logging.getLogger("main")
 
-app = FastAPI(title="Shop_BE")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    revocation = (
+        asyncio.create_task(revocations.run()) if config.security.stateless else None
+    )
+    listener = asyncio.create_task(invalidation.run())
+    collection = asyncio.create_task(collector.run(config.storage.gc_dry_run))
+    yield
+    collection.cancel()
+    listener.cancel()
+    if revocation is not None:
+        revocation.cancel()
+    shutdown_executor()
+    shutdown_renderer()
+    await storage.close()
+    await cache.close()
+    await dispose_engines()
+
+
+app = FastAPI(title="Shop_BE", lifespan=lifespan)
 app.state.limiter = freq_limiter
 app.add_exception_handler(RateLimitExceeded, RateLimitExceeded_handler)  # type: ignore
 app.add_exception_handler(HTTPException, http_exception_handler)  # type: ignore
@@ -27,9 +62,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(LimitUploadSize, max_upload_size=1024 * 1024 * 25)  # ~25MB
+if config.database.replicas:
+    app.add_middleware(PrimaryStickiness, max_age=config.database.replica_sticky)
+app.add_middleware(
+    LimitUploadSize,
+    max_upload_size=1024 * 1024,
+    # room for the form fields and multipart framing around the images
+    limits={
+        route: config.storage.request_size + 1024 * 1024
+        for route in ("POST /shop/add", "PUT /shop/item/{cid}")
+    },
+)
 
 app.include_router(user_router)
 app.include_router(shop_router)
 app.include_router(cart_router)
 app.include_router(order_router)
+app.include_router(admin_router)